@@ -0,0 +1,175 @@
+import numpy as np
+
+
+def weight_matrix(graph, weight='weight'):
+    """
+    Builds the dense weight matrix of a graph.
+
+    Parameters:
+    - graph (networkx.Graph): The graph.
+    - weight (str): The edge weight attribute. Default is 'weight'.
+
+    Returns:
+    - list: The node names, in the order of the rows and columns of the matrix.
+    - numpy.ndarray: The weight of the link between each pair of nodes, 0 on the
+      diagonal and infinity between nodes that are not linked.
+    """
+    names = list(graph.nodes)
+    index = {name: i for i, name in enumerate(names)}
+    weights = np.full((len(names), len(names)), np.inf)
+    for u, v, data in graph.edges(data=True):
+        i, j = index[u], index[v]
+        weights[i, j] = min(weights[i, j], data[weight])
+        if not graph.is_directed():
+            weights[j, i] = weights[i, j]
+    np.fill_diagonal(weights, 0)
+    return names, weights
+
+
+def floyd_warshall(weights):
+    """
+    Computes the shortest distances between all pairs of nodes with the Floyd-Warshall
+    algorithm.
+
+    Each step relaxes every pair of nodes through one intermediate node with whole-matrix
+    operations, so the V^3 work runs in NumPy instead of in Python loops.
+
+    Parameters:
+    - weights (numpy.ndarray): The weight matrix, as returned by weight_matrix().
+
+    Returns:
+    - numpy.ndarray: The shortest distance from each node (row) to each node (column).
+    - numpy.ndarray: The node preceding each destination (column) on the shortest path
+      from each source (row), -1 for the source itself and unreachable nodes.
+
+    Exceptions:
+    - ValueError: If the graph contains a negative weight cycle.
+    """
+    size = len(weights)
+    distances = weights.copy()
+    predecessors = np.where(np.isfinite(weights), np.arange(size, dtype=np.int32)[:, None], -1).astype(np.int32)
+    np.fill_diagonal(predecessors, -1)
+    through = np.empty_like(distances)
+    shorter = np.empty(distances.shape, dtype=bool)
+    for k in range(size):
+        np.add(distances[:, k, None], distances[k], out=through)
+        np.less(through, distances, out=shorter)
+        np.copyto(distances, through, where=shorter)
+        # The path to j through k ends like the path from k to j
+        np.copyto(predecessors, predecessors[k].copy(), where=shorter)
+    if np.any(np.diag(distances) < 0):
+        raise ValueError("Graph contains negative weight cycle")
+    return distances, predecessors
+
+
+def paths_from_predecessors(names, source, distances, predecessors):
+    """
+    Builds the shortest paths of a source node from its row of the predecessor matrix.
+
+    Paths sharing a prefix are built from the path of their predecessor, so each one
+    costs a single list copy.
+
+    Parameters:
+    - names (list): The node names, in the order of the matrices.
+    - source (int): The index of the source node.
+    - distances (numpy.ndarray): The row of the distance matrix of the source.
+    - predecessors (numpy.ndarray): The row of the predecessor matrix of the source.
+
+    Returns:
+    - dict: The shortest path from the source to every reachable node.
+    """
+    predecessors = predecessors.tolist()
+    known = {source: [names[source]]}
+    reachable = np.flatnonzero(np.isfinite(distances)).tolist()
+    for destination in reachable:
+        chain = []
+        node = destination
+        while node not in known:
+            chain.append(node)
+            node = predecessors[node]
+        path = known[node]
+        for node in reversed(chain):
+            path = path + [names[node]]
+            known[node] = path
+    return {names[destination]: known[destination] for destination in reachable}
+
+
+def all_pairs_shortest_paths(graph, weight='weight'):
+    """
+    Computes the shortest distances and paths between all pairs of nodes of a graph.
+
+    Parameters:
+    - graph (networkx.Graph): The graph.
+    - weight (str): The edge weight attribute. Default is 'weight'.
+
+    Returns:
+    - dict: The shortest distance from each node to every reachable node.
+    - dict: The shortest path from each node to every reachable node.
+
+    Exceptions:
+    - ValueError: If the graph contains a negative weight cycle.
+    """
+    names, weights = weight_matrix(graph, weight)
+    distances, predecessors = floyd_warshall(weights)
+    all_distances = {}
+    all_paths = {}
+    for i, source in enumerate(names):
+        reachable = np.flatnonzero(np.isfinite(distances[i]))
+        all_distances[source] = dict(zip([names[j] for j in reachable], distances[i, reachable].tolist()))
+        all_paths[source] = paths_from_predecessors(names, i, distances[i], predecessors[i])
+    return all_distances, all_paths
+
+
+def bellman_ford_csr(offsets, targets, weights, sources):
+    """
+    Computes the shortest distances from a batch of sources with the Bellman-Ford
+    algorithm over the arrays of an undirected CSR graph.
+
+    Each round relaxes every link for every source of the batch at once: the candidate
+    distances through the links of each node are reduced to their minimum with
+    numpy.minimum.reduceat over the groups of the CSR arrays. Since every link is stored
+    in both directions, the links of a node are also the links into it. The rounds stop
+    as soon as no distance improves.
+
+    Parameters:
+    - offsets (numpy.ndarray): The offsets array of the graph.
+    - targets (numpy.ndarray): The targets array of the graph.
+    - weights (numpy.ndarray): The weights array of the graph.
+    - sources (numpy.ndarray): The indexes of the source nodes.
+
+    Returns:
+    - numpy.ndarray: The shortest distance from each source (row) to each node (column).
+    - numpy.ndarray: The node preceding each destination (column) on the shortest path
+      from each source (row), -1 for the source itself and unreachable nodes.
+
+    Exceptions:
+    - ValueError: If the graph contains a negative weight cycle.
+    """
+    size = len(offsets) - 1
+    rows = np.arange(len(sources))
+    distances = np.full((len(sources), size), np.inf)
+    distances[rows, sources] = 0
+    predecessors = np.full((len(sources), size), -1, dtype=np.int32)
+    if len(targets) == 0:
+        return distances, predecessors
+
+    # Only nodes with links start a group, reduceat would misread empty ones
+    linked = np.flatnonzero(np.diff(offsets))
+    starts = offsets[linked]
+    for _ in range(size):
+        best = np.minimum.reduceat(distances[:, targets] + weights, starts, axis=1)
+        improved = best < distances[:, linked]
+        if not improved.any():
+            break
+        distances[:, linked] = np.where(improved, best, distances[:, linked])
+    else:
+        raise ValueError("Graph contains negative weight cycle")
+
+    # The predecessor of a node is the first neighbor through which its distance is reached
+    links = len(targets)
+    owners = np.repeat(np.arange(size), np.diff(offsets))
+    through = np.where(distances[:, targets] + weights == distances[:, owners], np.arange(links), links)
+    first = np.minimum.reduceat(through, starts, axis=1)
+    predecessors[:, linked] = np.where(first < links, targets[np.minimum(first, links - 1)], -1)
+    predecessors[rows, sources] = -1
+    return distances, predecessors
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import pickle
+import framing
+import routing_protocol
+import session_auth
+
+# Load public key from file
+file_pub = open('C:\Trabajo_Final_2corte_Info\pub_key.txt', 'rb')
+public_key = pickle.load(file_pub)
+file_pub.close()
+
+
+class AsyncTCPNode:
+    """
+    A class to represent an office running on a single asyncio event loop.
+
+    It routes messages exactly like TCPNode, but every connection is served by a
+    coroutine instead of a thread, so a busy office can carry thousands of concurrent
+    flows without a thread per connection.
+
+    Attributes:
+    - node_name (str): The name of the node.
+    - server_host (str): The host address of the controller server.
+    - server_port (int): The port of the controller server.
+    - listen_port (int): The port the node listens on for incoming connections.
+    - client_port (int): The port for client connections.
+    - host (str): The address the offices and clients listen on.
+    - routing_table (dict): The routing table for the node.
+    - routing_table_version (int): The version of the routing table.
+    - port_mapping (dict): The mapping of node names to ports.
+    - connections (dict): The open (reader, writer) streams to each next hop address.
+    - connection_locks (dict): Serializes the opening of the connection to each address.
+    - runtime (OfficeRuntime): The runtime hosting this office with others, or None.
+    - cut_through_size (int): The frame size above which frames are forwarded while they arrive.
+    - session_token (session_auth.SessionToken): The token signing the requests to the controller server.
+
+    Methods:
+    - start(retry_interval): Starts the server and subscribes to the controller server.
+    - server_request(request): Builds an authenticated request for the controller server.
+    - subscribe_to_server(retry_interval): Subscribes to the controller server to receive routing table updates.
+    - handle_client(reader, writer): Handles incoming messages from other nodes.
+    - next_hop_address(destination_node_name): Finds where a frame to a destination is sent to.
+    - route_message(destination_node_name, frame): Routes frames to their destination based on the routing table.
+    - stream_frame(frame, reader, remaining): Forwards a large frame while the rest of it is received.
+    - send_frame(address, frame, reader, remaining): Sends a frame over the persistent connection to an address.
+    - discard_frame(reader, remaining): Reads and discards the rest of a frame.
+    """
+    def __init__(self, node_name, server_host, server_port, listen_port, client_port, host="192.168.1.6",
+                 port_mapping=None, cut_through_size=65536):
+        """
+        Initializes the AsyncTCPNode with node details and loads the port mapping.
+
+        Parameters:
+        - node_name (str): The name of the node.
+        - server_host (str): The host address of the controller server.
+        - server_port (int): The port of the controller server.
+        - listen_port (int): The port the node listens on for incoming connections.
+        - client_port (int): The port for client connections.
+        - host (str): The address the offices and clients listen on.
+        - port_mapping (dict): The mapping of node names to ports. Loaded from
+          port_mapping.json when not given.
+        - cut_through_size (int): The frame size above which frames are forwarded to the
+          next hop while they are still being received.
+        """
+        self.node_name = node_name
+        self.server_host = server_host
+        self.server_port = server_port
+        self.listen_port = listen_port
+        self.client_port = client_port
+        self.host = host
+        self.routing_table = None
+        self.routing_table_version = 0
+        self.connections = {}
+        self.connection_locks = {}
+        self.runtime = None
+        self.cut_through_size = cut_through_size
+        self.session_token = None
+        # Load port mapping
+        if port_mapping is None:
+            with open("port_mapping.json", "r") as file:
+                port_mapping = json.load(file)
+        self.port_mapping = port_mapping
+
+    async def start(self, retry_interval=15):
+        """
+        Starts the server and subscribes to the controller server.
+
+        Parameters:
+        - retry_interval (float): Seconds to wait before subscribing again after an error.
+        """
+        server = await asyncio.start_server(self.handle_client, self.host, self.listen_port)
+        print(f"Office {self.node_name} listening on port {self.listen_port} //.....:")
+        subscription = asyncio.ensure_future(self.subscribe_to_server(retry_interval))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            subscription.cancel()
+
+    async def server_request(self, request):
+        """
+        Builds an authenticated request for the controller server, requesting a new
+        session token first if needed.
+
+        Parameters:
+        - request (str): The request, e.g. a subscription.
+
+        Returns:
+        - bytes: The signed request.
+        """
+        if self.session_token is None or not self.session_token.is_valid():
+            self.session_token = await session_auth.request_token_async(
+                (self.server_host, self.server_port), self.node_name, public_key)
+        return self.session_token.sign(request)
+
+    async def subscribe_to_server(self, retry_interval):
+        """
+        Subscribes to the controller server to receive routing table updates, with the
+        same protocol and retries as TCPNode.subscribe_to_server.
+
+        Parameters:
+        - retry_interval (float): Seconds to wait before subscribing again.
+        """
+        while True:
+            writer = None
+            updates = 0
+            try:
+                request = await self.server_request(routing_protocol.SUBSCRIBE_PREFIX + self.node_name)
+                reader, writer = await asyncio.open_connection(self.server_host, self.server_port)
+                writer.write(request)
+                await writer.drain()
+                while True:
+                    header = await reader.readexactly(routing_protocol.LENGTH_HEADER.size)
+                    (length,) = routing_protocol.LENGTH_HEADER.unpack(header)
+                    update_json = await reader.readexactly(length)
+                    updates += 1
+                    self.routing_table, self.routing_table_version = routing_protocol.apply_update(
+                        self.routing_table, self.routing_table_version, update_json)
+                    writer.write(routing_protocol.ACK_HEADER.pack(self.routing_table_version))
+                    await writer.drain()
+            except asyncio.IncompleteReadError:
+                if not updates:
+                    self.session_token = None
+                print("Subscription closed by the controller.")
+            except Exception as e:
+                print(f"Error while subscribed to server: {e}")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(retry_interval)
+
+    async def handle_client(self, reader, writer):
+        """
+        Handles incoming messages from other nodes.
+
+        Every frame is routed as soon as it is complete, without decoding its payload;
+        frames larger than cut_through_size are forwarded as soon as their header
+        arrives. A frame whose next hop cannot be reached is dropped and the next frames
+        of the connection are still forwarded. The connection is closed when the other
+        end closes it or sends an invalid frame.
+
+        Unlike framing.recv_frames in the threaded office, this path is not copy-free:
+        asyncio streams copy the received bytes into their own buffer, and each read
+        returns a new bytes object that is joined with the header into the frame.
+
+        Parameters:
+        - reader (asyncio.StreamReader): The stream to read frames from.
+        - writer (asyncio.StreamWriter): The stream of the same connection.
+        """
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(framing.FRAME_HEADER.size)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        raise ValueError("Connection closed in the middle of a frame")
+                    break
+                _, origin_length, destination_length, frame_size = framing.parse_frame_header(header)
+                header += await reader.readexactly(origin_length + destination_length)
+                if frame_size > self.cut_through_size:
+                    frame = framing.Frame(header)
+                else:
+                    frame = framing.Frame(header + await reader.readexactly(frame_size - len(header)))
+                print(f"Received user message from {frame.origin} to {frame.destination}")
+                try:
+                    if frame_size > self.cut_through_size:
+                        await self.stream_frame(frame, reader, frame_size - len(header))
+                    else:
+                        await self.route_message(frame.destination, frame)
+                except OSError as e:
+                    # The whole frame was read, the next ones may go to other next hops
+                    print(f"Error routing message to {frame.destination}: {e}")
+        except Exception as e:
+            print(f"Error handling client: {e}")
+        finally:
+            writer.close()
+
+    def next_hop_address(self, destination_node_name):
+        """
+        Finds where a frame to a destination is sent to.
+
+        Parameters:
+        - destination_node_name (str): The name of the destination node.
+
+        Returns:
+        - tuple: The name of the next hop and its (host, port) address, or None and the
+          address of the client if this office is the destination.
+        - None: If there is no route to the destination.
+        """
+        route = routing_protocol.next_hop(self.routing_table, self.node_name, self.port_mapping,
+                                          destination_node_name)
+        if route is None:
+            print(f"No route found to {destination_node_name}")
+            return None
+        if not route:
+            return None, (self.host, self.client_port)
+        next_hop, next_hop_port = route
+        if next_hop_port is None:
+            print(f"No outgoing port found for next hop {next_hop}.")
+            return None
+        return next_hop, (self.host, next_hop_port)
+
+    async def route_message(self, destination_node_name, frame):
+        """
+        Routes frames to their destination based on the routing table.
+
+        Parameters:
+        - destination_node_name (str): The name of the destination node.
+        - frame (framing.Frame): The frame to be routed, sent on exactly as it was received.
+        """
+        next_hop = self.next_hop_address(destination_node_name)
+        if next_hop is None:
+            return
+        next_hop, address = next_hop
+        if self.runtime is not None and self.runtime.is_local(address):
+            # The next hop lives in the same process, hand the message over directly
+            await self.runtime.handoff(address, frame)
+        else:
+            await self.send_frame(address, frame.data)
+        if next_hop is None:
+            print(f"The Office {self.node_name} is the destination... the message was sent to the client.")
+        else:
+            print(f"Office {self.node_name} routed message to {destination_node_name} at hop {next_hop}")
+
+    async def stream_frame(self, frame, reader, remaining):
+        """
+        Forwards a large frame while the rest of it is received (cut-through forwarding).
+
+        Frames to an office of the same runtime are received whole and handed over, and
+        frames without a route are read and discarded.
+
+        Parameters:
+        - frame (framing.Frame): The header of the frame.
+        - reader (asyncio.StreamReader): The stream the rest of the frame is read from.
+        - remaining (int): The number of bytes of the frame not yet read.
+        """
+        next_hop = self.next_hop_address(frame.destination)
+        if next_hop is None:
+            await self.discard_frame(reader, remaining)
+            return
+        next_hop, address = next_hop
+        if self.runtime is not None and self.runtime.is_local(address):
+            frame = framing.Frame(bytes(frame.data) + await reader.readexactly(remaining))
+            await self.runtime.handoff(address, frame)
+        else:
+            await self.send_frame(address, frame.data, reader, remaining)
+        print(f"Office {self.node_name} streamed message to {frame.destination} at hop {next_hop or 'client'}")
+
+    async def send_frame(self, address, frame, reader=None, remaining=0):
+        """
+        Sends a frame over the persistent connection to an address.
+
+        The connection is opened on first use and opened again once if it cannot be used,
+        whether it was closed by the other end or could not be opened. Waiting for the
+        stream to drain slows down the senders of a next hop that cannot keep up, without
+        blocking the other flows.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the next hop.
+        - frame (bytes-like): The encoded frame, or its first bytes if reader is given.
+        - reader (asyncio.StreamReader): The stream the rest of the frame is copied from,
+          piece by piece, while holding the connection.
+        - remaining (int): The number of bytes to copy from reader.
+
+        Exceptions:
+        - OSError: If the next hop cannot be reached. The rest of the frame has then been
+          read from reader and discarded.
+        - ValueError: If reader closes in the middle of the frame.
+        """
+        lock = self.connection_locks.setdefault(address, asyncio.Lock())
+        try:
+            async with lock:
+                connection = None
+                try:
+                    for attempt in range(2):
+                        connection = self.connections.get(address)
+                        try:
+                            if connection is None or connection[0].at_eof() or connection[1].is_closing():
+                                if connection is not None:
+                                    connection[1].close()
+                                connection = None
+                                connection = await asyncio.open_connection(*address)
+                                self.connections[address] = connection
+                            connection[1].write(frame)
+                            await connection[1].drain()
+                            break
+                        except OSError:
+                            if connection is not None:
+                                connection[1].close()
+                            self.connections.pop(address, None)
+                            if attempt:
+                                raise
+                    while remaining:
+                        chunk = await reader.read(min(remaining, 65536))
+                        if not chunk:
+                            raise ValueError("Connection closed in the middle of a frame")
+                        remaining -= len(chunk)
+                        connection[1].write(chunk)
+                        await connection[1].drain()
+                except (OSError, ValueError):
+                    # The next hop must not wait for the rest of a truncated frame
+                    if connection is not None:
+                        connection[1].close()
+                    self.connections.pop(address, None)
+                    raise
+        except OSError:
+            # Skip what is left of the frame, so that the next frames can still be read
+            await self.discard_frame(reader, remaining)
+            raise
+
+    async def discard_frame(self, reader, remaining):
+        """
+        Reads and discards the rest of a frame that is not forwarded.
+
+        Parameters:
+        - reader (asyncio.StreamReader): The stream the rest of the frame is read from.
+        - remaining (int): The number of bytes of the frame not yet read.
+        """
+        while remaining:
+            remaining -= len(await reader.readexactly(min(remaining, 65536)))
+
@@ -0,0 +1,266 @@
+import os
+import struct
+import threading
+import time
+
+# RIFF header of a WAV file: the chunk id, the size of the rest of the file and the format
+WAV_HEADER = struct.Struct('<4sI4s')
+
+
+class AudioTransfer:
+    """
+    A class to represent an audio file being received in chunks.
+
+    The whole file is written in place into a buffer allocated once its size is known
+    from the WAV header carried by the first chunk. Chunks that arrive before the first
+    one are kept aside until then.
+
+    Attributes:
+    - chunk_size (int): The size of every chunk but the last one.
+    - max_size (int): The maximum size of the file.
+    - total_size (int): The size of the whole file, or None until the first chunk arrives.
+    - buffer (bytearray): The file being reassembled, or None until the first chunk arrives.
+    - received (set of int): The sequence numbers already written.
+    - received_bytes (int): The number of bytes already written.
+    - early_chunks (dict): The chunks that arrived before the first one, by sequence number.
+    - early_bytes (int): The number of bytes kept in early_chunks.
+    - last_activity (float): The monotonic time of the last chunk.
+
+    Methods:
+    - add_chunk(sequence, chunk): Writes a chunk at its place in the file.
+    - write(sequence, chunk): Copies a chunk into the buffer.
+    - is_complete(): Checks whether every byte of the file was received.
+    - memory_size(): Returns the number of bytes held by the transfer.
+    """
+    def __init__(self, chunk_size, max_size):
+        """
+        Initializes a transfer with no chunks.
+
+        Parameters:
+        - chunk_size (int): The size of every chunk but the last one.
+        - max_size (int): The maximum size of the file.
+        """
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.total_size = None
+        self.buffer = None
+        self.received = set()
+        self.received_bytes = 0
+        self.early_chunks = {}
+        self.early_bytes = 0
+        self.last_activity = time.monotonic()
+
+    def add_chunk(self, sequence, chunk):
+        """
+        Writes a chunk at its place in the file.
+
+        Duplicated chunks are ignored.
+
+        Parameters:
+        - sequence (int): The sequence number of the chunk.
+        - chunk (bytes): The plain chunk.
+
+        Exceptions:
+        - ValueError: If the first chunk is not a WAV header, the file is too large or a chunk
+          does not fit in the file.
+        """
+        self.last_activity = time.monotonic()
+        if sequence in self.received or sequence in self.early_chunks:
+            return
+        if self.buffer is None:
+            if sequence != 0:
+                self.early_chunks[sequence] = chunk
+                self.early_bytes += len(chunk)
+                return
+            if len(chunk) < WAV_HEADER.size:
+                raise ValueError("The audio message is not a WAV file")
+            riff, size, wave = WAV_HEADER.unpack_from(chunk)
+            if riff != b'RIFF' or wave != b'WAVE':
+                raise ValueError("The audio message is not a WAV file")
+            if size + 8 > self.max_size:
+                raise ValueError(f"The audio file of {size + 8} bytes is too large")
+            self.total_size = size + 8
+            self.buffer = bytearray(self.total_size)
+            self.write(sequence, chunk)
+            for early_sequence, early_chunk in self.early_chunks.items():
+                self.write(early_sequence, early_chunk)
+            self.early_chunks.clear()
+            self.early_bytes = 0
+        else:
+            self.write(sequence, chunk)
+
+    def write(self, sequence, chunk):
+        """
+        Copies a chunk into the buffer.
+
+        Parameters:
+        - sequence (int): The sequence number of the chunk.
+        - chunk (bytes): The plain chunk.
+
+        Exceptions:
+        - ValueError: If the chunk does not fit in the file.
+        """
+        offset = sequence * self.chunk_size
+        if len(chunk) > self.chunk_size or offset + len(chunk) > self.total_size:
+            raise ValueError(f"Audio chunk {sequence} does not fit in a file of {self.total_size} bytes")
+        memoryview(self.buffer)[offset:offset + len(chunk)] = chunk
+        self.received.add(sequence)
+        self.received_bytes += len(chunk)
+
+    def is_complete(self):
+        """
+        Checks whether every byte of the file was received.
+
+        Returns:
+        - bool: True if the file is complete.
+        """
+        return self.buffer is not None and self.received_bytes == self.total_size
+
+    def memory_size(self):
+        """
+        Returns the number of bytes held by the transfer.
+
+        Returns:
+        - int: The size of the buffer plus the size of the chunks kept aside.
+        """
+        return self.early_bytes + (self.total_size or 0)
+
+
+class AudioReassembler:
+    """
+    A class to reassemble the audio files received by a client.
+
+    Transfers are identified by their origin and transfer id. The memory held by all
+    the transfers in progress is bounded: a transfer that would exceed the budget is
+    dropped, and so is a transfer that received nothing for stale_timeout seconds.
+
+    Attributes:
+    - output_dir (str): The directory the completed files are written to.
+    - max_memory (int): The maximum number of bytes held by the transfers in progress.
+    - stale_timeout (float): Seconds after which an idle transfer is dropped.
+    - transfers (dict): The transfer in progress of each (origin, transfer id).
+    - dropped (dict): The time each dropped (origin, transfer id) was dropped. They are
+      forgotten after stale_timeout seconds, like idle transfers.
+    - keyring (SessionKeyring): The keyring holding the session of each transfer, whose
+      entry is removed when the transfer is dropped, or None.
+
+    Methods:
+    - start_transfer(origin, transfer_id, chunk_size): Starts receiving a transfer.
+    - add_chunk(origin, transfer_id, sequence, chunk): Adds a chunk to a transfer.
+    - memory_used(): Returns the number of bytes held by the transfers in progress.
+    - drop(key): Drops a transfer and ignores its remaining chunks.
+    - evict_stale(): Drops the transfers that have been idle for too long and forgets
+      old dropped transfers.
+    """
+    def __init__(self, output_dir=".", max_memory=64 * 1024 * 1024, stale_timeout=60, keyring=None):
+        """
+        Initializes a reassembler with no transfers.
+
+        Parameters:
+        - output_dir (str): The directory the completed files are written to.
+        - max_memory (int): The maximum number of bytes held by the transfers in progress.
+        - stale_timeout (float): Seconds after which an idle transfer is dropped.
+        - keyring (SessionKeyring): The keyring holding the session of each transfer, the
+          transfer id being the session id, or None.
+        """
+        self.output_dir = output_dir
+        self.max_memory = max_memory
+        self.stale_timeout = stale_timeout
+        self.transfers = {}
+        self.dropped = {}
+        self.keyring = keyring
+        self.lock = threading.Lock()
+
+    def start_transfer(self, origin, transfer_id, chunk_size):
+        """
+        Starts receiving a transfer.
+
+        Parameters:
+        - origin (str): The origin office of the transfer.
+        - transfer_id (bytes): The identifier of the transfer.
+        - chunk_size (int): The size of every chunk but the last one.
+        """
+        self.evict_stale()
+        with self.lock:
+            self.transfers.setdefault((origin, transfer_id), AudioTransfer(chunk_size, self.max_memory))
+
+    def add_chunk(self, origin, transfer_id, sequence, chunk):
+        """
+        Adds a chunk to a transfer and writes the file once it is complete.
+
+        Idle transfers are dropped first, so a stalled transfer does not keep its buffer
+        until another file starts.
+
+        Parameters:
+        - origin (str): The origin office of the transfer.
+        - transfer_id (bytes): The identifier of the transfer.
+        - sequence (int): The sequence number of the chunk.
+        - chunk (bytes): The plain chunk.
+
+        Returns:
+        - str: The path of the written file, if the chunk completed the transfer.
+        - None: If the transfer is still in progress or was dropped.
+        """
+        self.evict_stale()
+        key = (origin, transfer_id)
+        with self.lock:
+            transfer = self.transfers.get(key)
+            if transfer is None:
+                if key not in self.dropped:
+                    print(f"Audio chunk of an unknown transfer from Office {origin} discarded.")
+                return None
+            try:
+                transfer.add_chunk(sequence, chunk)
+            except ValueError as e:
+                print(f"Audio transfer from Office {origin} dropped: {e}")
+                self.drop(key)
+                return None
+            if self.memory_used() > self.max_memory:
+                print(f"Audio transfer from Office {origin} dropped: memory budget exceeded")
+                self.drop(key)
+                return None
+            if not transfer.is_complete():
+                return None
+            del self.transfers[key]
+
+        path = os.path.join(self.output_dir, f"audio_{origin}_{transfer_id.hex()}.wav")
+        with open(path, 'wb') as f:
+            f.write(transfer.buffer)
+        return path
+
+    def memory_used(self):
+        """
+        Returns the number of bytes held by the transfers in progress.
+
+        Returns:
+        - int: The memory held by every transfer.
+        """
+        return sum(transfer.memory_size() for transfer in self.transfers.values())
+
+    def drop(self, key):
+        """
+        Drops a transfer and ignores its remaining chunks. Its session is removed from the
+        keyring, if any.
+
+        Parameters:
+        - key (tuple): The (origin, transfer id) of the transfer.
+        """
+        self.transfers.pop(key, None)
+        self.dropped[key] = time.monotonic()
+        if self.keyring is not None:
+            self.keyring.remove_session(key[1])
+
+    def evict_stale(self):
+        """
+        Drops the transfers that received nothing for longer than stale_timeout, and
+        forgets the transfers dropped more than stale_timeout seconds ago.
+        """
+        now = time.monotonic()
+        with self.lock:
+            for key, dropped_at in list(self.dropped.items()):
+                if now - dropped_at > self.stale_timeout:
+                    del self.dropped[key]
+            for key, transfer in list(self.transfers.items()):
+                if now - transfer.last_activity > self.stale_timeout:
+                    print(f"Audio transfer from Office {key[0]} dropped: no chunk received for {self.stale_timeout} seconds")
+                    self.drop(key)
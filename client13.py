@@ -4,7 +4,11 @@ import threading
 import time
 import pickle
 import rsa
+import framing
+import session_crypto
+import audio_reassembly
 import dijkstra_bellman
+import routing_protocol
 from controllerserver import network
 
 CHUNK = 1024
@@ -19,6 +23,11 @@ file_pub = open('C:\Trabajo_Final_2corte_Info\pub_key.txt', 'rb')
 public_key = pickle.load(file_pub)
 file_pub.close()
 
+# Keys of the audio sessions received by this client
+sessions = session_crypto.SessionKeyring(private_key)
+# Audio files being received by this client
+audio_transfers = audio_reassembly.AudioReassembler(keyring=sessions)
+
 
 def encrypt_message(message, public_key):
     """
@@ -68,33 +77,33 @@ def send_message(origin_node, destination_node, message, public_key, message_typ
         client_socket.connect(("192.168.1.6", 1013))
         with open("routing_tables.json", "r") as file:
             routing_tables = json.load(file)
-            if origin_node in routing_tables:
-                routing_table_json = routing_tables[origin_node]
-                path = routing_table_json[destination_node]
+            path = routing_protocol.path_from_routing_tables(routing_tables, origin_node, destination_node)
 
         # If it is an audio message, attach the file to the message
         if message_type == "audio_message":
-            # Read the audio file and send it in parts
-            with open(audio_file, 'rb') as f:
-                i = 0
-                while i < 10:
-                    i += 1
-                    chunk = f.read(53)
+            # Only the session key is encrypted with RSA, the audio itself with the session key
+            session = session_crypto.SessionEncryptor(public_key, CHUNK)
+            data = {
+                "tipo": "session_key",
+                "origen": origin_node,
+                "destino": destination_node,
+                "mensaje": session.key_message()
+            }
+            client_socket.sendall(framing.encode_message(data))
+
+            # Stream the audio file in parts over the same connection
+            with open(message, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNK)
                     if not chunk:
                         break
-                    encrypted_chunk = encrypt_message(chunk, public_key)
                     data = {
                         "tipo": "audio_message",
                         "origen": origin_node,
                         "destino": destination_node,
-                        "mensaje": encrypted_chunk
+                        "mensaje": session.encrypt(chunk)
                     }
-
-                    # Establish a new connection to send the current chunk
-                    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    client_socket.connect(("192.168.1.6", 1013))
-                    client_socket.sendall(pickle.dumps(data))
-                    client_socket.close()
+                    client_socket.sendall(framing.encode_message(data))
 
         if message_type == "text_message":
             # Encrypt only the message
@@ -109,7 +118,7 @@ def send_message(origin_node, destination_node, message, public_key, message_typ
             }
 
             # Send the frame to the destination node
-            client_socket.sendall(pickle.dumps(data))
+            client_socket.sendall(framing.encode_message(data))
 
         # Close the connection
         dijkstra_bellman.visualize_path(path, network)
@@ -118,6 +127,21 @@ def send_message(origin_node, destination_node, message, public_key, message_typ
         print(f"Error sending message: {e}")
 
 
+def receive_audio_chunk(origin_node, decrypted_chunk):
+    """
+    Adds a decrypted audio chunk to its transfer and saves the file once it is complete.
+
+    Parameters:
+    - origin_node (str): The origin node of the transfer.
+    - decrypted_chunk (tuple): The session identifier, sequence number and plain chunk.
+    """
+    session_id, sequence, chunk = decrypted_chunk
+    path = audio_transfers.add_chunk(origin_node, session_id, sequence, chunk)
+    if path is not None:
+        sessions.remove_session(session_id)
+        print(f"Audio message received from Office {origin_node}, saved to {path}")
+
+
 def handle_client(client_socket, private_key):
     """
     Handles incoming messages from clients.
@@ -130,26 +154,31 @@ def handle_client(client_socket, private_key):
     - Prints an error message if an exception occurs.
     """
     try:
-        audio_chunks = b''
-        # Receive the message from the node
-        data = pickle.loads(client_socket.recv(1024))
-        message_type = data.get("tipo")
-        message = data.get("mensaje")
-
-        # Decrypt the message
-        decrypted_message = decrypt_message(message, private_key)
+        # Receive the messages from the node, a connection may carry several frames
+        for data in framing.recv_messages(client_socket):
+            message_type = data.get("tipo")
+            message = data.get("mensaje")
 
-        # Process the message according to its type
-        if message_type == "text_message":
-            print(f"Message received from Office {data['origen']}: {decrypted_message}")
-
-        elif message_type == "audio_message":
-            print(f"Audio message received from Office {data['origen']}")
-            audio_chunks += decrypted_message
-            print("Audio chunk received.")
-
-        else:
-            print("Unknown message type")
+            # Process the message according to its type
+            if message_type == "text_message":
+                decrypted_message = decrypt_message(message, private_key)
+                print(f"Message received from Office {data['origen']}: {decrypted_message}")
+
+            elif message_type == "session_key":
+                print(f"Audio session started by Office {data['origen']}")
+                session_id, chunk_size, decrypted_chunks = sessions.add_session(message)
+                audio_transfers.start_transfer(data['origen'], session_id, chunk_size)
+                # Chunks that arrived before the key are decrypted now
+                for decrypted_chunk in decrypted_chunks:
+                    receive_audio_chunk(data['origen'], decrypted_chunk)
+
+            elif message_type == "audio_message":
+                decrypted_chunk = sessions.decrypt(message)
+                if decrypted_chunk is not None:
+                    receive_audio_chunk(data['origen'], decrypted_chunk)
+
+            else:
+                print("Unknown message type")
 
     except Exception as e:
         print(f"Error handling client: {e}")
@@ -0,0 +1,183 @@
+import select
+import socket
+import threading
+import time
+
+
+class PooledConnection:
+    """
+    A class to represent a reusable connection to a next hop.
+
+    Attributes:
+    - sock (socket.socket): The connected socket, or None if it must be reopened.
+    - lock (threading.Lock): Serializes the frames written to the socket.
+    - last_used (float): The monotonic time of the last send.
+    """
+    def __init__(self):
+        """
+        Initializes a connection that is not open yet.
+        """
+        self.sock = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def close(self):
+        """
+        Closes the socket if it is open.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class ConnectionPool:
+    """
+    A class to keep persistent connections to the next hops of an office.
+
+    Each address gets a single connection that is reused by every message sent to it,
+    reopened if the other end dropped it and closed after being idle for a while.
+
+    Attributes:
+    - idle_timeout (float): Seconds after which an unused connection is closed.
+    - connect_timeout (float): Seconds to wait when opening a connection.
+    - connections (dict): The connection of each (host, port) address.
+
+    Methods:
+    - send(address, data): Sends data to an address over its pooled connection.
+    - send_chunks(address, chunks): Sends a sequence of pieces of data without interleaving other sends.
+    - evict_idle(): Closes the connections that have been idle for too long.
+    - close_all(): Closes every connection of the pool.
+    """
+    def __init__(self, idle_timeout=60, connect_timeout=5):
+        """
+        Initializes an empty pool.
+
+        Parameters:
+        - idle_timeout (float): Seconds after which an unused connection is closed.
+        - connect_timeout (float): Seconds to wait when opening a connection.
+        """
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.last_eviction = time.monotonic()
+
+    def send(self, address, data):
+        """
+        Sends data to an address over its pooled connection.
+
+        The connection is opened on first use and reopened once if sending fails, which
+        happens when the other end restarted or dropped an idle connection.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the next hop.
+        - data (bytes): The data to send.
+
+        Exceptions:
+        - OSError: If the data could not be sent over a fresh connection either.
+        """
+        self.send_chunks(address, (data,))
+
+    def send_chunks(self, address, chunks):
+        """
+        Sends a sequence of pieces of data without interleaving other sends.
+
+        Each piece is sent as soon as the iterable produces it, which lets a frame be
+        forwarded while it is still being received. Only the first piece is retried on a
+        fresh connection: if a later one fails, the connection is closed so that the next
+        hop does not wait for the rest of a truncated frame.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the next hop.
+        - chunks (iterable of bytes-like): The pieces of data to send, in order.
+
+        Exceptions:
+        - OSError: If the data could not be sent.
+        - ValueError: If the chunks could not be produced, e.g. the frame was truncated.
+        """
+        with self.lock:
+            connection = self.connections.get(address)
+            if connection is None:
+                connection = self.connections[address] = PooledConnection()
+        chunks = iter(chunks)
+        with connection.lock:
+            first = next(chunks, b'')
+            try:
+                if connection.sock is None or self.is_closed(connection.sock):
+                    self.reconnect(connection, address)
+                connection.sock.sendall(first)
+            except OSError:
+                # Retry once on a fresh connection
+                self.reconnect(connection, address)
+                try:
+                    connection.sock.sendall(first)
+                except OSError:
+                    connection.close()
+                    raise
+            try:
+                for chunk in chunks:
+                    connection.sock.sendall(chunk)
+            except (OSError, ValueError):
+                connection.close()
+                raise
+            connection.last_used = time.monotonic()
+        if time.monotonic() - self.last_eviction > self.idle_timeout / 2:
+            self.evict_idle()
+
+    def reconnect(self, connection, address):
+        """
+        Replaces the socket of a connection with a newly opened one.
+
+        Parameters:
+        - connection (PooledConnection): The connection to reopen.
+        - address (tuple): The (host, port) address of the next hop.
+        """
+        connection.close()
+        connection.sock = socket.create_connection(address, timeout=self.connect_timeout)
+        connection.sock.settimeout(None)
+
+    def is_closed(self, sock):
+        """
+        Checks whether the other end closed a connection.
+
+        Next hops never write back, so a readable socket means the connection was
+        closed or reset.
+
+        Parameters:
+        - sock (socket.socket): The socket to check.
+
+        Returns:
+        - bool: True if the connection can no longer be used.
+        """
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            return bool(readable) and not sock.recv(1, socket.MSG_PEEK)
+        except (OSError, ValueError):
+            return True
+
+    def evict_idle(self):
+        """
+        Closes the connections that have been idle for longer than idle_timeout.
+
+        Connections in use by another thread are left alone.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.last_eviction = now
+            for address, connection in list(self.connections.items()):
+                if now - connection.last_used > self.idle_timeout and connection.lock.acquire(blocking=False):
+                    try:
+                        connection.close()
+                        del self.connections[address]
+                    finally:
+                        connection.lock.release()
+
+    def close_all(self):
+        """
+        Closes every connection of the pool.
+        """
+        with self.lock:
+            for connection in self.connections.values():
+                with connection.lock:
+                    connection.close()
+            self.connections.clear()
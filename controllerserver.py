@@ -1,11 +1,16 @@
 import socket
 import threading
 import json
-import networkx as nx
 import dijkstra_bellman
-import rsa
 import pickle
+import routing_protocol
+import session_auth
+from concurrent.futures import ThreadPoolExecutor
+from decrypt_pool import DecryptPool
+from parallel_routes import ParallelRoutes
 from network import Network
+from timing_wheel import TimingWheel
+from dynamic_spf import DynamicSPF
 
 # Load private key from file
 file_pri = open('C:\Trabajo_Final_2corte_Info\pri_key.txt', 'rb')
@@ -58,45 +63,173 @@ network.add_link(12, 14, 600)
 network.add_link(13, 14, 300)
 
 
+class Subscription:
+    """
+    A class to represent the routing table subscription of a node.
+
+    At most one update is in flight per subscription: new routing tables computed while
+    waiting for an acknowledgement are coalesced and sent once it arrives, as a delta
+    against the acknowledged routing table.
+
+    Attributes:
+    - client_socket (socket.socket): The socket of the subscribed node.
+    - acked_version (int): The routing table version acknowledged by the node.
+    - acked_table (dict): The routing table acknowledged by the node, or None.
+    - sent_version (int): The version of the update waiting for acknowledgement, or None.
+    - sent_table (dict): The routing table of the update waiting for acknowledgement.
+    """
+    def __init__(self, client_socket):
+        """
+        Initializes a subscription that has not received any routing table yet.
+
+        Parameters:
+        - client_socket (socket.socket): The socket of the subscribed node.
+        """
+        self.client_socket = client_socket
+        self.acked_version = None
+        self.acked_table = None
+        self.sent_version = None
+        self.sent_table = None
+
+    def acknowledge(self, version):
+        """
+        Records the routing table version the node acknowledged.
+
+        Parameters:
+        - version (int): The version of the routing table held by the node. If it is not
+          the version that was sent, the next update is a full snapshot.
+        """
+        if version == self.sent_version:
+            self.acked_version = self.sent_version
+            self.acked_table = self.sent_table
+        else:
+            self.acked_version = None
+            self.acked_table = None
+        self.sent_version = None
+        self.sent_table = None
+
+
 class TCPServer:
-    def __init__(self, host, port, algorithm_type):
+    def __init__(self, host, port, algorithm_type, table_format='paths', workers=16, backlog=128,
+                 decrypt_processes=0, route_processes=0):
         """
         Initializes the TCPServer instance.
 
         Parameters:
         - host (str): The IP address the server will bind to.
         - port (int): The port number the server will listen on.
-        - algorithm_type (str): The routing algorithm to use ('dijkstra' or 'bellman').
+        - algorithm_type (str): The routing algorithm to use ('dijkstra', 'bellman' or
+          'floyd_warshall').
+        - table_format (str): The routing table format to generate: 'paths' for the full
+          path to every destination or 'next_hop' for the next hop and its port.
+        - workers (int): The number of threads serving requests. Connections accepted while
+          all of them are busy wait in the listen backlog. Subscriptions are not counted:
+          each one holds a thread of its own for as long as it is open.
+        - backlog (int): The number of pending connections the listening socket queues.
+        - decrypt_processes (int): The number of processes decrypting requests, 0 to
+          decrypt them in the serving threads. Worth it for keys large enough that a
+          decryption costs more than handing it to another process.
+        - route_processes (int): The number of processes computing shortest-path trees,
+          0 to compute them in the calling thread. Worth it for large topologies on a
+          machine with several cores; only used by 'bellman', whose trees the processes
+          compute with a batched Bellman-Ford over the CSR arrays.
         """
+        if table_format not in ('paths', 'next_hop'):
+            raise ValueError("Invalid table format specified. Use 'paths' or 'next_hop'.")
         self.host = host
         self.port = port
         self.server_socket = None
+        self.running = False
+        # Removal deadline of each node, all of them kept on a single timing wheel
+        self.timers = TimingWheel()
         self.node_timers = {}
+        self.node_timers_lock = threading.Lock()
         self.algorithm = algorithm_type
+        self.table_format = table_format
+        # Load port mapping, used to resolve next hops to ports
+        with open("port_mapping.json", "r") as file:
+            self.port_mapping = json.load(file)
+        # Shortest-path trees are kept between updates and only repaired where the topology changed
+        self.route_pool = ParallelRoutes(route_processes if algorithm_type == 'bellman' else 0)
+        self.spf = DynamicSPF(network.graph, algorithm_type, network.csr, self.route_pool)
+        self.topology_lock = threading.Lock()
+        # Serialized routing table of each node, ready to be sent as is
+        self.routing_table_cache = {}
+        # Routing table of each node and the version in which it last changed
+        self.routing_tables = {}
+        self.routing_table_versions = {}
+        self.routing_tables_version = 0
+        self.routing_tables_file_lock = threading.Lock()
+        # Subscription of each node that receives pushed updates
+        self.subscribers = {}
+        self.subscribers_lock = threading.Lock()
+        # Requests are served by a bounded pool of threads and decrypted in other processes
+        self.workers = workers
+        self.backlog = backlog
+        self.worker_pool = None
+        self.worker_slots = threading.Semaphore(workers)
+        self.decrypt_pool = DecryptPool(private_key, decrypt_processes)
+        # Nodes authenticate once with RSA and then sign their requests with a session token
+        self.session_authority = session_auth.SessionAuthority()
 
     def start(self):
         """
-        Starts the TCP server to listen for incoming connections.
+        Starts the TCP server to listen for incoming connections, until stop() is called
+        or the server is interrupted.
         """
         # Create a TCP server socket
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         # Bind the socket to the address and port
         self.server_socket.bind((self.host, self.port))
         # Listen for incoming connections
-        self.server_socket.listen(5)
+        self.server_socket.listen(self.backlog)
         print(f"Server listening on {self.host}:{self.port}...")
-        # Start a timer to update routing tables periodically
-        threading.Timer(30, self.update_routing_tables).start()
-        while True:
-            try:
-                # Accept a new connection
-                client_socket, client_address = self.server_socket.accept()
-                print(f"Connection established with {client_address}")
-                # Start a new thread to handle the client
-                client_handler_thread = threading.Thread(target=self.handle_client, args=(client_socket,))
-                client_handler_thread.start()
-            except Exception as e:
-                print(f"Error accepting connection: {e}")
+        self.worker_pool = ThreadPoolExecutor(self.workers)
+        self.decrypt_pool.start()
+        self.route_pool.start()
+        # Compute the routing tables before serving them, then update them periodically
+        self.compute_routing_tables()
+        self.timers.start()
+        self.timers.schedule_periodic(30, self.update_routing_tables)
+        self.running = True
+        try:
+            while self.running:
+                # Wait for a free worker, leaving the next connections in the listen backlog
+                self.worker_slots.acquire()
+                try:
+                    # Accept a new connection
+                    client_socket, client_address = self.server_socket.accept()
+                    print(f"Connection established with {client_address}")
+                    # Hand the client over to a worker, which frees its slot when done
+                    request = self.worker_pool.submit(self.handle_client, client_socket)
+                    request.add_done_callback(lambda _: self.worker_slots.release())
+                except Exception as e:
+                    self.worker_slots.release()
+                    if self.running:
+                        print(f"Error accepting connection: {e}")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stops the timers and accepting connections, waits for the requests being served
+        and stops the worker processes, freeing the shared memory of the route processes.
+        """
+        if not self.running:
+            return
+        self.running = False
+        # No timer may hand work to the worker threads once they are shut down
+        self.timers.stop()
+        try:
+            # Wakes up the accept() of start(), which closing the socket alone does not
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server_socket.close()
+        self.worker_pool.shutdown()
+        self.route_pool.shutdown()
+        self.decrypt_pool.shutdown()
+        print("Server stopped.")
 
     def handle_client(self, client_socket):
         """
@@ -105,89 +238,295 @@ class TCPServer:
         Parameters:
         - client_socket (socket.socket): The client socket object.
         """
+        subscribed = False
         try:
-            # Receive the encrypted node name from the client
-            encrypted_node_name = client_socket.recv(1024)
+            # Receive the request, signed with a session token or encrypted with RSA
+            request = client_socket.recv(1024)
 
-            # Decrypt the node name
-            node_name_bytes = rsa.decrypt(encrypted_node_name, private_key)
-            node_name = node_name_bytes.decode()  # Convertir bytes a cadena
+            node_name = self.session_authority.verify(request)
+            if node_name is None:
+                # Decrypt the node name
+                node_name_bytes = self.decrypt_pool.decrypt(request)
+                node_name = node_name_bytes.decode()  # Convertir bytes a cadena
+                if node_name.startswith(session_auth.AUTH_PREFIX):
+                    # Token request: the only RSA decryption a node needs until its token expires
+                    client_socket.sendall(self.session_authority.grant(node_name))
+                    print("Session token granted.")
+                    return
+
+            if node_name.startswith(routing_protocol.SUBSCRIBE_PREFIX):
+                self.handle_subscription(client_socket, node_name[len(routing_protocol.SUBSCRIBE_PREFIX):])
+                subscribed = True
+                return
 
             print(f"Received request from node: {node_name}")
 
-            # If there is an existing timer for the node, cancel it
-            if node_name in self.node_timers:
-                self.node_timers[node_name].cancel()
-            # Start a new timer for the node
-            self.node_timers[node_name] = threading.Timer(30, self.remove_node, args=(node_name,))
-            self.node_timers[node_name].start()
+            # Push back the removal deadline of the node
+            self.schedule_removal(node_name)
             # Send routing table for the corresponding node
-            with open("routing_tables.json", "r") as file:
-                routing_tables = json.load(file)
-                if node_name in routing_tables:
-                    routing_table_json = json.dumps(routing_tables[node_name], indent=4)
-                    client_socket.sendall(routing_table_json.encode())
-                    print(f"Routing table sent to {node_name}.")
-                else:
-                    print(f"No routing table found for node {node_name}.")
-                    node_id = node_name[-1]
-                    self.add_node_to_network(node_name, node_id)
+            routing_table_bytes = self.routing_table_cache.get(node_name)
+            if routing_table_bytes is not None:
+                client_socket.sendall(routing_table_bytes)
+                print(f"Routing table sent to {node_name}.")
+            else:
+                print(f"No routing table found for node {node_name}.")
+                node_id = node_name[-1]
+                self.add_node_to_network(node_name, node_id)
         except Exception as e:
             print(f"Error handling client: {e}")
         finally:
-            # Close the client socket
+            # Close the client socket, subscriptions are closed when they end
+            if not subscribed:
+                client_socket.close()
+
+    def handle_subscription(self, client_socket, node_name):
+        """
+        Subscribes a node to its routing table until the connection closes.
+
+        The current routing table is pushed right away and compute_routing_tables pushes
+        the changes every time it changes. The node acknowledges each update with the
+        version it holds, which are read by a thread of the subscription so that it does
+        not hold a worker for as long as it lasts. These threads are outside the worker
+        pool, so the server runs one more thread per subscribed node. The node is
+        considered alive while the subscription is open; once it closes, the usual
+        removal timer starts.
+
+        Parameters:
+        - client_socket (socket.socket): The socket of the subscribed node.
+        - node_name (str): The name of the subscribed node.
+        """
+        print(f"Node {node_name} subscribed to routing table updates.")
+        with self.node_timers_lock:
+            removal = self.node_timers.pop(node_name, None)
+            if removal is not None:
+                self.timers.cancel(removal)
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        subscription = Subscription(client_socket)
+        with self.subscribers_lock:
+            self.subscribers[node_name] = subscription
+            has_routing_table = node_name in self.routing_tables
+        self.send_routing_table(node_name, subscription)
+        if not has_routing_table:
+            print(f"No routing table found for node {node_name}.")
+            node_id = node_name[-1]
+            self.add_node_to_network(node_name, node_id)
+        threading.Thread(target=self.receive_acks, args=(client_socket, node_name, subscription),
+                         daemon=True).start()
+
+    def receive_acks(self, client_socket, node_name, subscription):
+        """
+        Receives the acknowledgements of a subscribed node until the connection closes.
+
+        Parameters:
+        - client_socket (socket.socket): The socket of the subscribed node.
+        - node_name (str): The name of the subscribed node.
+        - subscription (Subscription): The subscription of the node.
+        """
+        try:
+            while True:
+                version = routing_protocol.recv_ack(client_socket)
+                if version is None:
+                    break
+                with self.subscribers_lock:
+                    subscription.acknowledge(version)
+                # Send the routing tables computed while the update was in flight
+                self.send_routing_table(node_name, subscription)
+        except OSError as e:
+            print(f"Error receiving acknowledgement from {node_name}: {e}")
+        finally:
             client_socket.close()
+            with self.subscribers_lock:
+                still_subscribed = self.subscribers.get(node_name) is subscription
+                if still_subscribed:
+                    del self.subscribers[node_name]
+            print(f"Subscription of node {node_name} closed.")
+            # A newer subscription of the same node keeps it alive
+            if still_subscribed:
+                self.schedule_removal(node_name)
+
+    def schedule_removal(self, node_name):
+        """
+        Schedules the removal of a node, replacing its previous removal deadline.
+
+        Parameters:
+        - node_name (str): The name of the node.
+        """
+        with self.node_timers_lock:
+            previous = self.node_timers.get(node_name)
+            if previous is not None:
+                self.timers.cancel(previous)
+            self.node_timers[node_name] = self.timers.schedule(30, self.expire_node, node_name)
+
+    def push_routing_tables(self, updated_nodes):
+        """
+        Pushes the new routing tables to the subscribed nodes whose table changed.
+
+        Parameters:
+        - updated_nodes (set): The names of the nodes whose routing table changed.
+        """
+        with self.subscribers_lock:
+            subscriptions = [(node_name, self.subscribers[node_name])
+                             for node_name in updated_nodes & self.subscribers.keys()]
+        for node_name, subscription in subscriptions:
+            self.send_routing_table(node_name, subscription)
+
+    def send_routing_table(self, node_name, subscription):
+        """
+        Sends a subscribed node the changes to its routing table since the version it
+        acknowledged, or a full snapshot if it has not acknowledged any.
+
+        Nothing is sent while a previous update is waiting for acknowledgement. The update
+        is built under subscribers_lock and sent after releasing it, so a node that stops
+        reading only holds up the thread sending to it; as it never has more than one
+        update in flight, that send does not block for long either. If the send fails,
+        the subscription is shut down and ends like a closed one. Must be called without
+        subscribers_lock held.
+
+        Parameters:
+        - node_name (str): The name of the subscribed node.
+        - subscription (Subscription): The subscription of the node.
+        """
+        with self.subscribers_lock:
+            if subscription.sent_version is not None or node_name not in self.routing_tables:
+                return
+            version = self.routing_table_versions[node_name]
+            if version == subscription.acked_version:
+                return
+            routing_table = self.routing_tables[node_name]
+            update = None
+            if subscription.acked_table is not None:
+                update = routing_protocol.delta_update(version, routing_table,
+                                                       subscription.acked_version, subscription.acked_table)
+            if update is None:
+                update = routing_protocol.full_update(version, self.routing_table_cache[node_name])
+            subscription.sent_version = version
+            subscription.sent_table = routing_table
+        try:
+            routing_protocol.send_update(subscription.client_socket, update)
+            print(f"Routing table version {version} pushed to {node_name}.")
+        except OSError as e:
+            print(f"Error pushing routing table to {node_name}: {e}")
+            try:
+                # Wakes up receive_acks, which drops the subscription
+                subscription.client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
 
     def compute_routing_tables(self):
         """
         Computes routing tables using the specified algorithm.
+
+        Only the shortest-path trees affected by the topology changes recorded since the
+        last run are recomputed, and nothing is recomputed when the topology is unchanged.
+        The tables are written to routing_tables.json after releasing topology_lock.
         """
-        if self.algorithm == 'dijkstra':
-            all_paths = dict(nx.all_pairs_dijkstra_path(network.graph))
-        elif self.algorithm == 'bellman':
-            all_paths = dict(nx.all_pairs_bellman_ford_path(network.graph))
-        else:
-            raise ValueError(
-                "Invalid algorithm specified. Use 'dijkstra' or 'bellman_ford'.")
-
-        routing_tables = {}
-        for node, paths in all_paths.items():
-            routing_tables[node] = {}
-            for destination, path in paths.items():
-                routing_tables[node][destination] = path
-        with open("routing_tables.json", "w") as file:
-            json.dump(routing_tables, file, indent=4)
-        print("Routing tables written to routing_tables.json.")
-        # Schedule the next update
-        threading.Timer(30, self.update_routing_tables).start()
+        routing_tables = None
+        with self.topology_lock:
+            changes = network.pop_changes()
+            if self.spf.paths and not changes:
+                updated_nodes = set()
+            else:
+                updated_nodes = self.spf.update(changes)
+
+            if updated_nodes or changes:
+                routing_tables = {}
+                for node, paths in self.spf.paths.items():
+                    if self.table_format == 'next_hop':
+                        routing_tables[node] = routing_protocol.next_hop_table(paths, self.port_mapping)
+                    else:
+                        routing_tables[node] = {}
+                        for destination, path in paths.items():
+                            routing_tables[node][destination] = path
+                self.update_routing_table_cache(routing_tables, updated_nodes)
+                version = self.routing_tables_version
+            else:
+                print("Topology unchanged, routing tables are up to date.")
+        self.push_routing_tables(updated_nodes)
+        if routing_tables is not None:
+            with self.routing_tables_file_lock:
+                # A later computation writes its own tables, which must not be overwritten
+                if version == self.routing_tables_version:
+                    with open("routing_tables.json", "w") as file:
+                        json.dump(routing_tables, file, indent=4)
+                    print(f"Routing tables written to routing_tables.json ({len(updated_nodes)} trees recomputed).")
+
+    def update_routing_table_cache(self, routing_tables, updated_nodes):
+        """
+        Serializes the routing tables that changed and publishes the new cache.
+
+        The routing tables that changed get a new version. The cache is replaced in a
+        single assignment so that handle_client always sees a complete set of tables.
+
+        Parameters:
+        - routing_tables (dict): The routing table of every node.
+        - updated_nodes (set): The names of the nodes whose routing table changed.
+        """
+        self.routing_tables_version += 1
+        cache = {node: routing_table_bytes for node, routing_table_bytes in self.routing_table_cache.items()
+                 if node in routing_tables and node not in updated_nodes}
+        versions = {node: version for node, version in self.routing_table_versions.items() if node in cache}
+        for node, routing_table in routing_tables.items():
+            if node not in cache:
+                cache[node] = json.dumps(routing_table, separators=(',', ':')).encode()
+                versions[node] = self.routing_tables_version
+        with self.subscribers_lock:
+            self.routing_table_cache = cache
+            self.routing_tables = routing_tables
+            self.routing_table_versions = versions
 
     def update_routing_tables(self):
         """
-        Updates routing tables periodically.
+        Updates routing tables periodically and after every topology change.
+
+        The computation runs on a worker thread, so that the timing wheel does not hold
+        up the other timers and topology changes do not wait for it.
+        """
+        self.worker_pool.submit(self.compute_routing_tables)
+
+    def expire_node(self, node_name):
+        """
+        Hands the removal of a node over to a worker once its removal deadline expires.
+
+        Called from the timing wheel, which must not wait for topology_lock. A node that
+        sent a request or subscribed while its timer was firing already replaced or
+        dropped the timer, and is kept.
+
+        Parameters:
+        - node_name (str): The name of the node to remove.
         """
-        threading.Thread(target=self.compute_routing_tables).start()
+        with self.node_timers_lock:
+            removal = self.node_timers.get(node_name)
+            if removal is None or removal.deadline > self.timers.current_tick:
+                return
+            del self.node_timers[node_name]
+        self.worker_pool.submit(self.remove_node, node_name)
 
     def remove_node(self, node_name):
         """
-        Removes a node from the network.
+        Removes a node from the network and updates the routing tables right away, so
+        that traffic is routed around it without waiting for the periodic update.
 
         Parameters:
         - node_name (str): The name of the node to remove.
         """
         print(f"Removing node {node_name} from topology.")
-        network.remove_node(node_name)
+        with self.topology_lock:
+            network.remove_node(node_name)
+        self.update_routing_tables()
 
     def add_node_to_network(self, node_name, node_id):
         """
-        Adds a node back to the network.
+        Adds a node back to the network and updates the routing tables right away.
 
         Parameters:
         - node_name (str): The name of the node to add.
         - node_id (int): The ID of the node to add.
         """
         print(f"Node {node_name} reconnected. Adding it back to the network.")
-        network.add_node(node_id, node_name)
-        network.display_network()
+        with self.topology_lock:
+            network.add_node(node_id, node_name)
+            network.display_network()
+        self.update_routing_tables()
 
 
 if __name__ == "__main__":
@@ -195,6 +534,17 @@ if __name__ == "__main__":
     print("Select the algorithm for calculate routes")
     print("   -> bellman")
     print("   -> dijkstra")
+    print("   -> floyd_warshall")
     algorithm_type = input("Enter the word: ")
-    server = TCPServer("192.168.1.6", 1234, algorithm_type)
+    print("Select the routing table format")
+    print("   -> paths")
+    print("   -> next_hop")
+    table_format = input("Enter the word: ")
+    # Empty answers keep the defaults
+    workers = int(input("Enter the number of worker threads (default 16): ") or 16)
+    backlog = int(input("Enter the size of the listen backlog (default 128): ") or 128)
+    decrypt_processes = int(input("Enter the number of decryption processes (default 0): ") or 0)
+    route_processes = int(input("Enter the number of route processes, used by bellman (default 0): ") or 0)
+    server = TCPServer("192.168.1.6", 1234, algorithm_type, table_format, workers, backlog, decrypt_processes,
+                       route_processes)
     server.start()
@@ -0,0 +1,156 @@
+import numpy as np
+
+
+class CSRGraph:
+    """
+    A class to represent an undirected weighted graph in compressed sparse row form.
+
+    Nodes are numbered with integer indexes. The links of node i are stored in
+    targets[offsets[i]:offsets[i + 1]], with their weights at the same positions of
+    weights, sorted by target; each link is stored once in each direction. This takes a
+    few bytes per link instead of the dictionaries of a networkx graph, and lets the
+    routing algorithms run over contiguous arrays.
+
+    Changes are recorded and merged into the arrays the next time they are read, so a
+    batch of changes costs a single rebuild.
+
+    Attributes:
+    - names (list): The name of the node of each index, None for indexes not in use.
+    - index (dict): The index of each node name.
+    - offsets (numpy.ndarray): The position of the first link of each node in targets,
+      followed by the number of links.
+    - targets (numpy.ndarray): The index of the node at the other end of each link.
+    - weights (numpy.ndarray): The weight of each link.
+
+    Methods:
+    - add_node(name): Adds a node and returns its index.
+    - remove_node(name): Removes a node and its links.
+    - add_edge(u, v, weight): Adds a link or updates its weight.
+    - remove_edge(u, v): Removes a link.
+    - arrays(): Returns the offsets, targets and weights arrays, merging the pending changes.
+    """
+    def __init__(self):
+        """
+        Initializes an empty graph.
+        """
+        self.names = []
+        self.index = {}
+        self.offsets = np.zeros(1, dtype=np.int32)
+        self.targets = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float64)
+        # Changes not merged into the arrays yet
+        self.added_edges = {}
+        self.removed_edges = set()
+        self.removed_nodes = set()
+        # Indexes of removed nodes whose links are gone from the arrays, ready to be reused
+        self.free = []
+
+    def add_node(self, name):
+        """
+        Adds a node, if it is not in the graph yet.
+
+        Parameters:
+        - name (str): The name of the node.
+
+        Returns:
+        - int: The index of the node.
+        """
+        if name in self.index:
+            return self.index[name]
+        if self.free:
+            node = self.free.pop()
+            self.names[node] = name
+        else:
+            node = len(self.names)
+            self.names.append(name)
+        self.index[name] = node
+        return node
+
+    def remove_node(self, name):
+        """
+        Removes a node and its links.
+
+        Parameters:
+        - name (str): The name of the node.
+        """
+        node = self.index.pop(name, None)
+        if node is None:
+            return
+        self.names[node] = None
+        self.removed_nodes.add(node)
+
+    def add_edge(self, u, v, weight):
+        """
+        Adds a link between two nodes, or updates its weight if it already exists.
+
+        Parameters:
+        - u (str): The name of one endpoint of the link.
+        - v (str): The name of the other endpoint of the link.
+        - weight (float): The weight of the link.
+        """
+        i, j = self.index[u], self.index[v]
+        self.added_edges[(i, j)] = weight
+        self.added_edges[(j, i)] = weight
+
+    def remove_edge(self, u, v):
+        """
+        Removes the link between two nodes.
+
+        Parameters:
+        - u (str): The name of one endpoint of the link.
+        - v (str): The name of the other endpoint of the link.
+        """
+        i, j = self.index[u], self.index[v]
+        self.added_edges.pop((i, j), None)
+        self.added_edges.pop((j, i), None)
+        self.removed_edges.add((i, j))
+        self.removed_edges.add((j, i))
+
+    def arrays(self):
+        """
+        Returns the arrays of the graph, merging the pending changes first.
+
+        Returns:
+        - numpy.ndarray: The offsets array.
+        - numpy.ndarray: The targets array.
+        - numpy.ndarray: The weights array.
+        """
+        if self.added_edges or self.removed_edges or self.removed_nodes or len(self.offsets) <= len(self.names):
+            self.merge()
+        return self.offsets, self.targets, self.weights
+
+    def merge(self):
+        """
+        Rebuilds the arrays with the pending changes.
+
+        Links of removed nodes, removed links and links whose weight changed are dropped
+        from the arrays, the added links of nodes still in the graph are appended, and
+        the result is sorted by source and target.
+        """
+        size = len(self.names)
+        sources = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+        targets = self.targets.astype(np.int64)
+        keep = np.ones(len(targets), dtype=bool)
+        added = np.array(list(self.added_edges), dtype=np.int64).reshape(-1, 2)
+        added_weights = np.fromiter(self.added_edges.values(), dtype=np.float64, count=len(added))
+        if self.removed_nodes:
+            removed = np.fromiter(self.removed_nodes, dtype=np.int64, count=len(self.removed_nodes))
+            keep &= ~np.isin(sources, removed) & ~np.isin(targets, removed)
+            added_kept = ~np.isin(added[:, 0], removed) & ~np.isin(added[:, 1], removed)
+            added, added_weights = added[added_kept], added_weights[added_kept]
+        replaced = self.removed_edges | self.added_edges.keys()
+        if replaced:
+            keys = np.fromiter((i * size + j for i, j in replaced), dtype=np.int64, count=len(replaced))
+            keep &= ~np.isin(sources * size + targets, keys)
+        sources = np.concatenate([sources[keep], added[:, 0]])
+        targets = np.concatenate([targets[keep], added[:, 1]])
+        weights = np.concatenate([self.weights[keep], added_weights])
+        order = np.lexsort((targets, sources))
+        self.targets = targets[order].astype(np.int32)
+        self.weights = weights[order]
+        self.offsets = np.zeros(size + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=size), out=self.offsets[1:])
+        self.free.extend(self.removed_nodes)
+        self.added_edges = {}
+        self.removed_edges = set()
+        self.removed_nodes = set()
@@ -0,0 +1,99 @@
+import multiprocessing
+import rsa
+from concurrent.futures import ProcessPoolExecutor
+
+# Private key of a worker process, set once when the process starts
+worker_private_key = None
+
+
+def init_worker(private_key):
+    """
+    Stores the private key in a worker process.
+
+    Parameters:
+    - private_key (rsa.PrivateKey): The private key used to decrypt requests.
+    """
+    global worker_private_key
+    worker_private_key = private_key
+
+
+def decrypt_in_worker(data):
+    """
+    Decrypts data in a worker process.
+
+    Parameters:
+    - data (bytes): The RSA-encrypted data.
+
+    Returns:
+    - bytes: The decrypted data.
+    """
+    return rsa.decrypt(data, worker_private_key)
+
+
+class DecryptPool:
+    """
+    A class to run RSA decryptions in worker processes.
+
+    RSA private-key operations are pure Python and hold the GIL, so running them in
+    separate processes keeps them from stalling the threads serving other requests.
+
+    Attributes:
+    - private_key (rsa.PrivateKey): The private key used to decrypt requests.
+    - processes (int): The number of worker processes, 0 to decrypt in the calling thread.
+    - executor (ProcessPoolExecutor): The worker processes, or None until started.
+
+    Methods:
+    - start(): Starts the worker processes.
+    - decrypt(data): Decrypts data in a worker process.
+    - shutdown(): Stops the worker processes.
+    """
+    def __init__(self, private_key, processes=2):
+        """
+        Initializes the pool without starting its processes.
+
+        Parameters:
+        - private_key (rsa.PrivateKey): The private key used to decrypt requests.
+        - processes (int): The number of worker processes, 0 to decrypt in the calling thread.
+        """
+        self.private_key = private_key
+        self.processes = processes
+        self.executor = None
+
+    def start(self):
+        """
+        Starts the worker processes.
+
+        The processes are spawned rather than forked, as forking a process that already
+        runs threads may deadlock, and all of them are started right away so that the
+        first requests do not wait for them.
+        """
+        if self.processes > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(self.processes, multiprocessing.get_context("spawn"),
+                                                initializer=init_worker, initargs=(self.private_key,))
+            for started in [self.executor.submit(init_worker, self.private_key) for _ in range(self.processes)]:
+                started.result()
+
+    def decrypt(self, data):
+        """
+        Decrypts data in a worker process, waiting for the result.
+
+        Parameters:
+        - data (bytes): The RSA-encrypted data.
+
+        Returns:
+        - bytes: The decrypted data.
+
+        Exceptions:
+        - rsa.DecryptionError: If the data could not be decrypted.
+        """
+        if self.executor is None:
+            return rsa.decrypt(data, self.private_key)
+        return self.executor.submit(decrypt_in_worker, data).result()
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
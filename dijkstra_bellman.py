@@ -1,6 +1,7 @@
 import networkx as nx
 import matplotlib.pyplot as plt
 from network import Network
+from parallel_routes import ParallelRoutes
 
 
 def find_path_bellman_ford(self, start_node_name, end_node_name):
@@ -48,72 +49,38 @@ def find_path_bellman_ford(self, start_node_name, end_node_name):
     return path
 
 
-def compute_shortest_paths_bellman_ford(network):
+def compute_shortest_paths_bellman_ford(network, batch_size=256, route_pool=None):
     """
     Compute the shortest paths for all pairs of nodes using the Bellman-Ford algorithm.
 
+    The links are relaxed over the CSR arrays of the network for a batch of sources at
+    once, and the sources are split across the route processes when a started pool is
+    given.
+
     Parameters:
     - network (Network): The network containing the graph and nodes.
+    - batch_size (int): The number of sources computed together. Each batch holds
+      batch_size rows of candidate distances per link.
+    - route_pool (ParallelRoutes): Started route processes to split the sources across,
+      or None to compute them in the calling thread.
 
     Returns:
-    - dict: A dictionary with shortest paths from each node to every other node.
+    - dict: A dictionary with shortest paths from each node to every other node, None
+      for the nodes that cannot be reached.
     - None: If a negative weight cycle is detected.
     """
+    if route_pool is None:
+        route_pool = ParallelRoutes(0, batch_size)
+    node_names = [name for name in network.csr.names if name is not None]
+    try:
+        _, all_paths = route_pool.compute(network.csr, node_names)
+    except ValueError as e:
+        print(e)
+        return None
 
-    # Initialize the results dictionary
     shortest_paths = {}
-
-    # Iterate over all nodes as source nodes
-    for source_node in network.nodes.values():
-        # Initialize the dictionary to store the shortest paths from the source node
-        source_paths = {}
-
-        # Initialize the distances and predecessors
-        distances = {node.name: float('inf') for node in network.nodes.values()}
-        predecessors = {node.name: None for node in network.nodes.values()}
-
-        # We set the distance from the source node to 0
-        distances[source_node.name] = 0
-
-        # Traverse the edges up to V-1 times
-        for _ in range(len(network.nodes) - 1):
-            for u, v, data in network.graph.edges(data=True):
-                weight = data['weight']
-                if distances[u] != float('inf') and distances[u] + weight < distances[v]:
-                    distances[v] = distances[u] + weight
-                    predecessors[v] = u
-
-                # Considerar también la dirección opuesta del enlace
-                if distances[v] != float('inf') and distances[v] + weight < distances[u]:
-                    distances[u] = distances[v] + weight
-                    predecessors[u] = v
-
-        # Check negative weight cycles
-        for u, v, data in network.graph.edges(data=True):
-            if distances[u] != float('inf') and distances[u] + data['weight'] < distances[v]:
-                print("El grafo contiene un ciclo de peso negativo")
-                return None
-
-        # Build the shortest paths from the source node to the other nodes
-        for target_node in network.nodes.values():
-            if source_node.name == target_node.name:
-                source_paths[target_node.name] = [source_node.name]  # El nodo fuente tiene camino hacia sí mismo
-            else:
-                path = []
-                step = target_node.name
-                while step is not None:
-                    path.append(step)
-                    step = predecessors[step]
-                path.reverse()
-                if path[0] == source_node.name:
-                    source_paths[target_node.name] = path
-                else:
-                    # Cannot reach destination from origin
-                    source_paths[target_node.name] = None
-
-        # Add the shortest paths from the source node to the result dictionary
-        shortest_paths[source_node.name] = source_paths
-
+    for source_name, source_paths in all_paths.items():
+        shortest_paths[source_name] = {target_name: source_paths.get(target_name) for target_name in node_names}
     return shortest_paths
 
 
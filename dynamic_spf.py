@@ -0,0 +1,211 @@
+import networkx as nx
+import all_pairs
+
+
+class DynamicSPF:
+    """
+    A class to keep all-pairs shortest paths up to date as the topology changes.
+
+    Instead of recomputing every shortest-path tree on each update, only the trees
+    affected by the recorded topology changes are recomputed. A tree is affected when
+    it uses a link or node that was removed or modified, or when a new link offers a
+    shorter path than the one currently known.
+
+    The 'floyd_warshall' algorithm computes all the trees at once over a weight matrix,
+    which is cheaper than finding and recomputing the affected ones.
+
+    With the 'bellman' algorithm and a started pool of route processes, the trees to
+    recompute are split across them and computed with a batched Bellman-Ford over the
+    CSR view of the graph instead. 'dijkstra' always runs in this thread.
+
+    Attributes:
+    - graph (networkx.Graph): The graph the shortest paths are computed on.
+    - csr (CSRGraph): The CSR view of the same graph, used by the route processes.
+    - route_pool (ParallelRoutes): The route processes, or None to compute in this thread.
+    - algorithm (str): The routing algorithm to use ('dijkstra', 'bellman' or 'floyd_warshall').
+    - distances (dict): The shortest distance from each source to every reachable node.
+    - paths (dict): The shortest path from each source to every reachable node.
+
+    Methods:
+    - compute_all(): Computes the shortest-path trees of every node from scratch.
+    - update(changes): Recomputes only the trees affected by the given changes.
+    """
+    def __init__(self, graph, algorithm='dijkstra', csr=None, route_pool=None):
+        """
+        Initializes the engine with an empty set of shortest-path trees.
+
+        Parameters:
+        - graph (networkx.Graph): The graph the shortest paths are computed on.
+        - algorithm (str): The routing algorithm to use ('dijkstra', 'bellman' or 'floyd_warshall').
+        - csr (CSRGraph): The CSR view of the same graph, required with a route pool.
+        - route_pool (ParallelRoutes): The route processes, or None to compute in this thread.
+        """
+        if algorithm == 'dijkstra':
+            self.single_source = nx.single_source_dijkstra
+        elif algorithm == 'bellman':
+            self.single_source = nx.single_source_bellman_ford
+        elif algorithm == 'floyd_warshall':
+            self.single_source = None
+        else:
+            raise ValueError(
+                "Invalid algorithm specified. Use 'dijkstra', 'bellman_ford' or 'floyd_warshall'.")
+        self.graph = graph
+        self.algorithm = algorithm
+        self.csr = csr
+        self.route_pool = route_pool
+        self.distances = {}
+        self.paths = {}
+
+    def compute_all(self):
+        """
+        Computes the shortest-path trees of every node from scratch.
+
+        Returns:
+        - set: The names of all the source nodes.
+        """
+        if self.algorithm == 'floyd_warshall':
+            self.distances, self.paths = all_pairs.all_pairs_shortest_paths(self.graph)
+            return set(self.paths)
+        self.distances = {}
+        self.paths = {}
+        self.compute_sources(list(self.graph.nodes))
+        return set(self.paths)
+
+    def compute_sources(self, sources):
+        """
+        Computes the shortest-path trees of some source nodes, in the route processes
+        when the algorithm is 'bellman' and they are started.
+
+        Parameters:
+        - sources (list): The names of the source nodes.
+        """
+        if self.algorithm == 'bellman' and self.route_pool is not None and self.route_pool.executor is not None:
+            distances, paths = self.route_pool.compute(self.csr, sources)
+            self.distances.update(distances)
+            self.paths.update(paths)
+        else:
+            for source in sources:
+                self.compute_source(source)
+
+    def compute_source(self, source):
+        """
+        Computes the shortest-path tree of a single source node.
+
+        Parameters:
+        - source (str): The name of the source node.
+        """
+        distances, paths = self.single_source(self.graph, source, weight='weight')
+        self.distances[source] = distances
+        self.paths[source] = paths
+
+    def update(self, changes):
+        """
+        Recomputes only the shortest-path trees affected by the given changes.
+
+        Parameters:
+        - changes (list): Topology changes as returned by Network.pop_changes().
+
+        Returns:
+        - set: The names of the source nodes whose tree changed. It is empty when the
+          changes did not affect any tree.
+        """
+        if not self.paths:
+            return self.compute_all()
+        if self.algorithm == 'floyd_warshall':
+            previous = self.paths
+            self.compute_all()
+            return {source for source, paths in self.paths.items() if previous.get(source) != paths}
+
+        affected = set()
+        pruned = set()
+        for change in changes:
+            operation = change[0]
+            if operation == 'add_node':
+                affected.add(change[1])
+            elif operation == 'remove_node':
+                affected |= self.sources_through_node(change[1], pruned)
+            elif operation == 'remove_link':
+                affected |= self.sources_through_link(change[1], change[2])
+            elif operation == 'add_link':
+                # A re-added link may have a new weight, so trees using it are stale too
+                affected |= self.sources_through_link(change[1], change[2])
+                affected |= self.sources_improved_by_link(change[1], change[2])
+
+        # Forget the trees of the nodes that left the topology
+        for source in list(self.paths):
+            if source not in self.graph:
+                del self.paths[source]
+                del self.distances[source]
+                affected.discard(source)
+
+        self.compute_sources([source for source in affected if source in self.graph])
+        return affected | {source for source in pruned if source in self.paths}
+
+    def sources_through_node(self, node_name, pruned):
+        """
+        Finds the sources whose shortest-path tree goes through a node.
+
+        Sources that only reach the node as a leaf keep a valid tree, so the node is
+        simply dropped from it.
+
+        Parameters:
+        - node_name (str): The name of the removed node.
+        - pruned (set): Collects the sources the node was dropped from.
+
+        Returns:
+        - set: The names of the affected source nodes.
+        """
+        affected = set()
+        for source, paths in self.paths.items():
+            if node_name not in paths:
+                continue
+            if any(len(path) > 2 and node_name in path[1:-1] for path in paths.values()):
+                affected.add(source)
+            else:
+                del paths[node_name]
+                del self.distances[source][node_name]
+                pruned.add(source)
+        return affected
+
+    def sources_through_link(self, u, v):
+        """
+        Finds the sources whose shortest-path tree uses the link between u and v.
+
+        Parameters:
+        - u (str): The name of one endpoint of the link.
+        - v (str): The name of the other endpoint of the link.
+
+        Returns:
+        - set: The names of the affected source nodes.
+        """
+        affected = set()
+        for source, paths in self.paths.items():
+            path_v = paths.get(v)
+            path_u = paths.get(u)
+            if (path_v is not None and len(path_v) > 1 and path_v[-2] == u) or \
+                    (path_u is not None and len(path_u) > 1 and path_u[-2] == v):
+                affected.add(source)
+        return affected
+
+    def sources_improved_by_link(self, u, v):
+        """
+        Finds the sources for which the link between u and v offers a shorter path.
+
+        Parameters:
+        - u (str): The name of one endpoint of the link.
+        - v (str): The name of the other endpoint of the link.
+
+        Returns:
+        - set: The names of the affected source nodes.
+        """
+        if not self.graph.has_edge(u, v):
+            return set()
+        weight = self.graph[u][v]['weight']
+        inf = float('inf')
+        affected = set()
+        for source, distances in self.distances.items():
+            distance_u = distances.get(u, inf)
+            distance_v = distances.get(v, inf)
+            if distance_u + weight < distance_v or distance_v + weight < distance_u:
+                affected.add(source)
+        return affected
@@ -0,0 +1,357 @@
+import struct
+
+# Every frame starts with a fixed header:
+# magic, version, message type, origin length, destination length, payload length
+FRAME_HEADER = struct.Struct('!2sBBBBI')
+FRAME_MAGIC = b'TN'
+FRAME_VERSION = 1
+
+# Frames larger than this are rejected instead of being buffered
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+MESSAGE_TYPES = {
+    "text_message": 1,
+    "audio_message": 2,
+    "session_key": 3,
+}
+MESSAGE_TYPE_NAMES = {code: name for name, code in MESSAGE_TYPES.items()}
+
+
+def encode_message(message):
+    """
+    Encodes a message as a frame.
+
+    Parameters:
+    - message (dict): The message with its "tipo", "origen", "destino" and "mensaje" fields.
+      "mensaje" holds the payload as bytes.
+
+    Returns:
+    - bytes: The encoded frame.
+    """
+    origin = message["origen"].encode()
+    destination = message["destino"].encode()
+    payload = message["mensaje"]
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, MESSAGE_TYPES[message["tipo"]],
+                               len(origin), len(destination), len(payload))
+    return b''.join((header, origin, destination, payload))
+
+
+def parse_frame_header(buffer, offset=0):
+    """
+    Parses the fixed header of a frame.
+
+    Parameters:
+    - buffer (bytes-like): The buffer holding the frame.
+    - offset (int): The position of the frame in the buffer.
+
+    Returns:
+    - tuple: The message type, origin length, destination length and size of the whole frame.
+
+    Exceptions:
+    - ValueError: If the header is not valid.
+    """
+    magic, version, message_type, origin_length, destination_length, payload_length = \
+        FRAME_HEADER.unpack_from(buffer, offset)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("Invalid frame header")
+    if payload_length > MAX_PAYLOAD:
+        raise ValueError(f"Frame payload too large: {payload_length} bytes")
+    frame_size = FRAME_HEADER.size + origin_length + destination_length + payload_length
+    return message_type, origin_length, destination_length, frame_size
+
+
+class Frame:
+    """
+    A class to represent a received frame without decoding its payload.
+
+    Offices only need the destination to forward a frame, so the frame keeps the bytes
+    it was received in and is sent on as is.
+
+    Attributes:
+    - data (memoryview): The whole encoded frame.
+    - message_type (str): The type of the message.
+    - origin (str): The origin node.
+    - destination (str): The destination node.
+    - payload (memoryview): The payload of the frame.
+
+    Methods:
+    - from_message(message): Builds a frame from a message.
+    - to_message(): Decodes the frame into a message.
+    - chunks(): Returns the pieces of the encoded frame, in order.
+    """
+    def __init__(self, data):
+        """
+        Initializes the frame by parsing its header.
+
+        Parameters:
+        - data (bytes-like): The whole encoded frame.
+
+        Exceptions:
+        - ValueError: If the header is not valid.
+        """
+        self.data = memoryview(data)
+        message_type, origin_length, destination_length, _ = parse_frame_header(self.data)
+        start = FRAME_HEADER.size
+        payload_start = start + origin_length + destination_length
+        self.message_type = MESSAGE_TYPE_NAMES.get(message_type)
+        self.origin = str(self.data[start:start + origin_length], 'utf-8')
+        self.destination = str(self.data[start + origin_length:payload_start], 'utf-8')
+        self.payload = self.data[payload_start:]
+
+    @classmethod
+    def from_message(cls, message):
+        """
+        Builds a frame from a message.
+
+        Parameters:
+        - message (dict): The message with its "tipo", "origen", "destino" and "mensaje" fields.
+
+        Returns:
+        - Frame: The encoded frame.
+        """
+        return cls(encode_message(message))
+
+    def to_message(self):
+        """
+        Decodes the frame into a message.
+
+        Returns:
+        - dict: The message with its "tipo", "origen", "destino" and "mensaje" fields.
+        """
+        return {
+            "tipo": self.message_type,
+            "origen": self.origin,
+            "destino": self.destination,
+            "mensaje": bytes(self.payload)
+        }
+
+    def chunks(self):
+        """
+        Returns the pieces of the encoded frame, in order.
+
+        Returns:
+        - tuple of memoryview: The whole frame as a single piece.
+        """
+        return (self.data,)
+
+
+class StreamedFrame(Frame):
+    """
+    A class to represent a large frame whose payload is still being received.
+
+    The header is available as soon as it arrives, so the frame can be forwarded while
+    the rest of it is read from the connection piece by piece (cut-through forwarding).
+
+    Attributes:
+    - data (memoryview): The part of the frame already received.
+    - sock (socket.socket): The connection the rest of the frame is read from.
+    - remaining (int): The number of bytes of the frame not yet read.
+    - buffer_size (int): The maximum size of the pieces read.
+    - head_sent (bool): Whether the first bytes were already yielded.
+
+    Methods:
+    - chunks(): Yields the pieces of the frame as they are received.
+    - drain(): Reads and discards the rest of the frame.
+    - to_message(): Receives the rest of the frame and decodes it into a message.
+    """
+    def __init__(self, data, sock, remaining, buffer_size=65536):
+        """
+        Initializes the frame from its first bytes.
+
+        Parameters:
+        - data (bytes-like): The part of the frame already received, header included.
+        - sock (socket.socket): The connection the rest of the frame is read from.
+        - remaining (int): The number of bytes of the frame not yet read.
+        - buffer_size (int): The maximum size of the pieces read.
+        """
+        super().__init__(data)
+        self.sock = sock
+        self.remaining = remaining
+        self.buffer_size = buffer_size
+        self.head_sent = False
+
+    def chunks(self):
+        """
+        Yields the pieces of the frame as they are received.
+
+        The pieces are views of a buffer that is reused, so each one must be used before
+        the next one is requested.
+
+        Yields:
+        - memoryview: The first bytes of the frame, then each received piece.
+
+        Exceptions:
+        - ValueError: If the connection closes in the middle of the frame.
+        """
+        if not self.head_sent:
+            self.head_sent = True
+            yield self.data
+        view = memoryview(bytearray(min(self.buffer_size, self.remaining)))
+        while self.remaining:
+            received = self.sock.recv_into(view[:min(len(view), self.remaining)])
+            if not received:
+                raise ValueError("Connection closed in the middle of a frame")
+            self.remaining -= received
+            yield view[:received]
+
+    def drain(self):
+        """
+        Reads and discards the rest of the frame, if it was not forwarded.
+        """
+        for _ in self.chunks():
+            pass
+
+    def to_message(self):
+        """
+        Receives the rest of the frame and decodes it into a message.
+
+        Returns:
+        - dict: The message with its "tipo", "origen", "destino" and "mensaje" fields.
+        """
+        return Frame(b''.join(bytes(chunk) for chunk in self.chunks())).to_message()
+
+
+class FrameDecoder:
+    """
+    A class to decode a stream of frames received in arbitrary pieces.
+
+    The received pieces are appended to a buffer and each frame is copied out of it;
+    recv_frames avoids both copies when the frames are read from a socket.
+
+    Attributes:
+    - buffer (bytearray): The bytes received and not yet dropped.
+    - offset (int): The position in the buffer of the first byte not yet decoded.
+
+    Methods:
+    - feed(data): Adds received bytes and returns the messages completed by them.
+    - feed_frames(data): Adds received bytes and returns the frames completed by them.
+    """
+    def __init__(self):
+        """
+        Initializes the decoder with an empty buffer.
+        """
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns the messages completed by them.
+
+        Parameters:
+        - data (bytes): The received bytes, possibly holding partial or several frames.
+
+        Returns:
+        - list of dict: The decoded messages, in the order they were received.
+
+        Exceptions:
+        - ValueError: If the stream does not contain valid frames.
+        """
+        return [frame.to_message() for frame in self.feed_frames(data)]
+
+    def feed_frames(self, data):
+        """
+        Adds received bytes and returns the frames completed by them.
+
+        Parameters:
+        - data (bytes): The received bytes, possibly holding partial or several frames.
+
+        Returns:
+        - list of Frame: The frames, in the order they were received.
+
+        Exceptions:
+        - ValueError: If the stream does not contain valid frames.
+        """
+        self.buffer += data
+        frames = []
+        while len(self.buffer) - self.offset >= FRAME_HEADER.size:
+            _, _, _, frame_size = parse_frame_header(self.buffer, self.offset)
+            end = self.offset + frame_size
+            if len(self.buffer) < end:
+                break
+            frames.append(Frame(bytes(self.buffer[self.offset:end])))
+            self.offset = end
+        # Drop the decoded frames once they make up most of the buffer
+        if self.offset and self.offset * 2 >= len(self.buffer):
+            del self.buffer[:self.offset]
+            self.offset = 0
+        return frames
+
+
+def recv_frames(sock, buffer_size=65536, cut_through_size=None):
+    """
+    Receives the frames sent over a connection until it closes.
+
+    Bytes are received straight into buffers that are never resized, and every frame is
+    a view of the buffer it arrived in, so frames can be kept or forwarded without
+    copying them. Only the start of a frame left at the end of a full buffer is copied
+    to the next one, which is allocated large enough for the whole frame.
+
+    Frames larger than cut_through_size are not buffered: they are yielded as a
+    StreamedFrame as soon as their header is complete. The rest of such a frame is
+    read while the caller consumes its chunks, and discarded if the caller does not.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+    - buffer_size (int): The size of the receive buffers.
+    - cut_through_size (int): The size above which frames are streamed, or None to
+      always receive whole frames.
+
+    Yields:
+    - Frame: Each frame, in the order it was received.
+
+    Exceptions:
+    - ValueError: If the stream does not contain valid frames or ends in the middle of one.
+    """
+    view = memoryview(bytearray(buffer_size))
+    start = end = 0
+    while True:
+        # Bytes needed from the start of the buffer to go on: a fixed header, then the
+        # whole frame or, for streamed frames, only its header and names
+        needed = FRAME_HEADER.size
+        while end - start >= needed:
+            _, origin_length, destination_length, frame_size = parse_frame_header(view, start)
+            header_size = FRAME_HEADER.size + origin_length + destination_length
+            if end - start >= frame_size:
+                yield Frame(view[start:start + frame_size])
+                start += frame_size
+                needed = FRAME_HEADER.size
+            elif cut_through_size is not None and frame_size > cut_through_size:
+                if end - start < header_size:
+                    needed = header_size
+                    continue
+                frame = StreamedFrame(view[start:end], sock, frame_size - (end - start), buffer_size)
+                yield frame
+                frame.drain()
+                start = end
+                needed = FRAME_HEADER.size
+            else:
+                needed = frame_size
+        if start + needed > len(view) or (start == end and len(view) - end < buffer_size // 4):
+            # The frame does not fit in what is left of the buffer, move it to a new one
+            new_view = memoryview(bytearray(max(buffer_size, needed)))
+            new_view[:end - start] = view[start:end]
+            view, start, end = new_view, 0, end - start
+        received = sock.recv_into(view[end:])
+        if not received:
+            break
+        end += received
+    if end > start:
+        raise ValueError("Connection closed in the middle of a frame")
+
+
+def recv_messages(sock, buffer_size=65536):
+    """
+    Receives the messages sent over a connection until it closes.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+    - buffer_size (int): The size of the receive buffers.
+
+    Yields:
+    - dict: Each decoded message.
+
+    Exceptions:
+    - ValueError: If the stream does not contain valid frames or ends in the middle of one.
+    """
+    for frame in recv_frames(sock, buffer_size):
+        yield frame.to_message()
@@ -0,0 +1,44 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+def launch_offices(node_names, office_args, delay=0.1):
+    """
+    Starts one office process per node.
+
+    Parameters:
+    - node_names (list of str): The names of the offices to start.
+    - office_args (list of str): Extra command line arguments passed to every office.
+    - delay (float): Seconds to wait between two offices, to spread their subscriptions.
+
+    Returns:
+    - list of subprocess.Popen: The started processes.
+    """
+    processes = []
+    for node_name in node_names:
+        command = [sys.executable, "office.py", node_name] + office_args
+        processes.append(subprocess.Popen(command))
+        print(f"Office {node_name} started (pid {processes[-1].pid}).")
+        time.sleep(delay)
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Start every office of the topology. Unknown arguments are passed to office.py.")
+    parser.add_argument("--offices", nargs="*", help="names of the offices to start, all of port_mapping.json by default")
+    args, office_args = parser.parse_known_args()
+
+    with open("port_mapping.json", "r") as file:
+        node_names = args.offices or list(json.load(file))
+    processes = launch_offices(node_names, office_args)
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        print("Stopping offices...")
+        for process in processes:
+            process.terminate()
@@ -1,8 +1,11 @@
 class Link:
-    def __init__(self, source, destination, bandwidth):
-        self.source = source
-        self.destination = destination
+    __slots__ = ("source_id", "destination_id", "bandwidth")
+
+    def __init__(self, source_id, destination_id, bandwidth):
+        # Endpoints are referred to by node ID, the same IDs that key Network.nodes
+        self.source_id = source_id
+        self.destination_id = destination_id
         self.bandwidth = bandwidth
 
     def __repr__(self):
-        return f"Link({self.source} -> {self.destination}, Bandwidth={self.bandwidth} Gbps)"
\ No newline at end of file
+        return f"Link({self.source_id} -> {self.destination_id}, Bandwidth={self.bandwidth} Gbps)"
\ No newline at end of file
@@ -2,6 +2,7 @@ import networkx as nx
 import matplotlib.pyplot as plt
 from node import Node
 from link import Link
+from csr_graph import CSRGraph
 
 
 class Network:
@@ -10,14 +11,20 @@ class Network:
 
     Attributes:
     - nodes (dict): A dictionary of nodes in the network.
-    - links (list): A list of links connecting the nodes in the network.
+    - links (dict): The links connecting the nodes in the network, keyed by their
+      (source_id, destination_id) pair.
+    - node_ids (dict): The ID of each node name. The links of a node are found through
+      its neighbors in the graph, which is keyed by the same names.
     - graph (networkx.Graph): A graph representation of the network.
+    - csr (CSRGraph): A compact array representation of the graph, kept in sync with it.
+    - changes (list): Topology changes recorded since the last call to pop_changes().
 
     Methods:
     - add_node(node_id, name, node_type='router'): Adds a node to the network.
     - add_link(source_id, destination_id, bandwidth): Adds a link between two nodes in the network.
     - remove_node(node_name): Removes a node and its associated links from the network.
     - remove_link(source_id, destination_id): Removes a link between two nodes in the network.
+    - pop_changes(): Returns and clears the recorded topology changes.
     - display_network(): Prints the nodes and links in the network.
     - visualize_network(): Visualizes the network graph using matplotlib.
     """
@@ -26,8 +33,12 @@ class Network:
         Initialize the Network with an empty set of nodes and links.
         """
         self.nodes = {}
-        self.links = []
+        self.links = {}
+        # Indexes kept by every change, so that lookups and removals do not scan the network
+        self.node_ids = {}
         self.graph = nx.Graph()
+        self.csr = CSRGraph()
+        self.changes = []
 
     def add_node(self, node_id, name, node_type='router'):
         """
@@ -41,9 +52,13 @@ class Network:
         Returns:
         - None
         """
-        if node_id not in self.nodes:
-            self.nodes[node_id] = Node(node_id, name, node_type)
-            self.graph.add_node(name, node_type=node_type)
+        if node_id not in self.nodes and name not in self.node_ids:
+            node = self.nodes[node_id] = Node(node_id, name, node_type)
+            # The graph, the indexes and the CSR view all key on the node's interned name
+            self.node_ids[node.name] = node_id
+            self.graph.add_node(node.name, node_type=node.node_type)
+            self.csr.add_node(node.name)
+            self.changes.append(('add_node', node.name))
 
     def add_link(self, source_id, destination_id, bandwidth):
         """
@@ -60,8 +75,13 @@ class Network:
         if source_id in self.nodes and destination_id in self.nodes:
             source_node = self.nodes[source_id]
             destination_node = self.nodes[destination_id]
-            self.links.append(Link(source_node, destination_node, bandwidth))
-            self.graph.add_edge(source_node.name, destination_node.name, weight=1/bandwidth)
+            # A single link per pair of nodes, as in the graph
+            self.links.pop((destination_id, source_id), None)
+            self.links[(source_id, destination_id)] = Link(source_id, destination_id, bandwidth)
+            weight = 1/bandwidth
+            self.graph.add_edge(source_node.name, destination_node.name, weight=weight)
+            self.csr.add_edge(source_node.name, destination_node.name, weight)
+            self.changes.append(('add_link', source_node.name, destination_node.name))
         else:
             print(f"Error ({source_id} y {destination_id}) no red")
 
@@ -75,14 +95,19 @@ class Network:
         Returns:
         - None
         """
-        for node_id, node in self.nodes.items():
-            if node.name == node_name:
-                del self.nodes[node_id]
-                self.graph.remove_node(node_name)
-                self.links = [link for link in self.links if
-                              link.source.name != node_name and link.destination.name != node_name]
-                return
-        print(f"Error: Node with name {node_name} not found")
+        node_id = self.node_ids.get(node_name)
+        if node_id is None:
+            print(f"Error: Node with name {node_name} not found")
+            return
+        for neighbor in self.graph.adj[node_name]:
+            neighbor_id = self.node_ids[neighbor]
+            self.links.pop((node_id, neighbor_id), None)
+            self.links.pop((neighbor_id, node_id), None)
+        del self.node_ids[node_name]
+        del self.nodes[node_id]
+        self.graph.remove_node(node_name)
+        self.csr.remove_node(node_name)
+        self.changes.append(('remove_node', node_name))
 
     def remove_link(self, source_id, destination_id):
         """
@@ -97,11 +122,28 @@ class Network:
         """
         if source_id in self.nodes and destination_id in self.nodes:
             self.graph.remove_edge(self.nodes[source_id].name, self.nodes[destination_id].name)
-            self.links = [link for link in self.links if
-                          link.source != self.nodes[source_id] or link.destination != self.nodes[destination_id]]
+            self.csr.remove_edge(self.nodes[source_id].name, self.nodes[destination_id].name)
+            # The graph is undirected, so a link added in the other direction is gone too
+            self.links.pop((source_id, destination_id), None)
+            self.links.pop((destination_id, source_id), None)
+            self.changes.append(('remove_link', self.nodes[source_id].name, self.nodes[destination_id].name))
         else:
             print("Error: Source or destination node not found")
 
+    def pop_changes(self):
+        """
+        Returns the topology changes recorded since the last call and clears them.
+
+        Each change is a tuple whose first element is the operation ('add_node',
+        'add_link', 'remove_node' or 'remove_link') followed by the node names involved.
+
+        Returns:
+        - list: The recorded changes, oldest first.
+        """
+        changes = self.changes
+        self.changes = []
+        return changes
+
     def display_network(self):
         """
         Prints the nodes and links in the network.
@@ -113,7 +155,7 @@ class Network:
         for node in self.nodes.values():
             print(node)
         print("\nLinks in the network:")
-        for link in self.links:
+        for link in self.links.values():
             print(link)
 
     def visualize_network(self):
@@ -129,5 +171,3 @@ class Network:
         labels = nx.get_edge_attributes(self.graph, 'weight')
         nx.draw_networkx_edge_labels(self.graph, pos, edge_labels=labels, font_size=7)
         plt.show()
-
-
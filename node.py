@@ -1,8 +1,14 @@
+import sys
+
+
 class Node:
+    __slots__ = ("node_id", "name", "node_type")
+
     def __init__(self, node_id, name, node_type='router'):
         self.node_id = node_id
-        self.name = name
-        self.node_type = node_type
+        # Interned, so the graph, the indexes and the node share a single copy of the name
+        self.name = sys.intern(name)
+        self.node_type = sys.intern(node_type)
 
     def __repr__(self):
         return f"Node({self.name}, ID={self.node_id}, Type={self.node_type})"
\ No newline at end of file
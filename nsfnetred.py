@@ -39,5 +39,6 @@ network.add_link(11, 13, 1500)
 network.add_link(12, 14, 600)
 network.add_link(13, 14, 300)
 
-network.display_network()
-network.visualize_network()
+if __name__ == "__main__":
+    network.display_network()
+    network.visualize_network()
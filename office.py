@@ -0,0 +1,352 @@
+import argparse
+import socket
+import json
+import threading
+import time
+import pickle
+import framing
+import routing_protocol
+import session_auth
+from connection_pool import ConnectionPool
+from send_queue import SendQueues
+
+# Load private key from file
+file_pri = open('C:\Trabajo_Final_2corte_Info\pri_key.txt', 'rb')
+private_key = pickle.load(file_pri)
+file_pri.close()
+
+# Load public key from file
+file_pub = open('C:\Trabajo_Final_2corte_Info\pub_key.txt', 'rb')
+public_key = pickle.load(file_pub)
+file_pub.close()
+
+
+class TCPNode:
+    """
+    A class to represent a TCP Node in a network.
+
+    Attributes:
+    - node_name (str): The name of the node.
+    - server_host (str): The host address of the controller server.
+    - server_port (int): The port of the controller server.
+    - listen_port (int): The port the node listens on for incoming connections.
+    - outgoing_ports (list of int): A list of ports for outgoing connections.
+    - routing_table (dict): The routing table for the node.
+    - routing_table_version (int): The version of the routing table.
+    - client_port (int): The port for client connections.
+    - host (str): The address the offices and clients listen on.
+    - port_mapping (dict): The mapping of node names to ports.
+    - connection_pool (ConnectionPool): The persistent connections to the next hops.
+    - cut_through_size (int): The frame size above which frames are forwarded while they arrive.
+    - send_queues (SendQueues): The bounded queues of frames waiting for each next hop.
+    - session_token (session_auth.SessionToken): The token signing the requests to the controller server.
+
+    Methods:
+    - start(): Starts the server and connects to the controller server.
+    - server_request(request): Builds an authenticated request for the controller server.
+    - connect_to_server(): Connects to the controller server to obtain the routing table.
+    - subscribe_to_server(retry_interval): Subscribes to the controller server to receive routing table updates.
+    - accept_connections(): Accepts incoming connections from other nodes.
+    - handle_client(client_socket): Handles incoming messages from other nodes.
+    - route_message(destination_node_name, frame): Routes frames to their destination based on the routing table.
+    """
+    def __init__(self, node_name, server_host, server_port, listen_port, outgoing_ports, client_port,
+                 host="192.168.1.6", cut_through_size=65536, queue_depth=1000, queue_policy="block",
+                 batch_delay=0.001, batch_size=64):
+        """
+        Initializes the TCPNode with node details and loads the port mapping.
+
+        Parameters:
+        - node_name (str): The name of the node.
+        - server_host (str): The host address of the controller server.
+        - server_port (int): The port of the controller server.
+        - listen_port (int): The port the node listens on for incoming connections.
+        - outgoing_ports (list of int): A list of ports for outgoing connections.
+        - client_port (int): The port for client connections.
+        - host (str): The address the offices and clients listen on.
+        - cut_through_size (int): The frame size above which frames are forwarded to the
+          next hop while they are still being received.
+        - queue_depth (int): The maximum number of frames waiting for each next hop.
+        - queue_policy (str): "block" to make senders wait when a queue is full, pushing
+          back on upstream offices, or "drop" to drop the frame.
+        - batch_delay (float): The maximum number of seconds a small frame waits for others
+          going to the same next hop, to send them in a single write.
+        - batch_size (int): The maximum number of frames sent in a single write.
+        """
+        self.node_name = node_name
+        self.server_host = server_host
+        self.server_port = server_port
+        self.listen_port = listen_port
+        self.outgoing_ports = outgoing_ports
+        self.routing_table = None
+        self.routing_table_version = 0
+        self.client_port = client_port
+        self.host = host
+        # Load port mapping
+        with open("port_mapping.json", "r") as file:
+            self.port_mapping = json.load(file)
+        # Persistent connections to the next hops and the client, reused by every message
+        self.connection_pool = ConnectionPool()
+        self.cut_through_size = cut_through_size
+        # Each next hop is sent to by its own thread, so a slow one does not stall the others
+        self.send_queues = SendQueues(self.connection_pool, queue_depth, queue_policy, batch_delay, batch_size)
+        self.session_token = None
+
+    def start(self):
+        """
+        Starts the server and connects to the controller server.
+
+        This method initializes the server socket to listen for incoming connections
+        and starts a thread to handle these connections. It also connects to the
+        controller server to obtain the routing table.
+        """
+        # Start server for incoming connections
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.bind((self.host, self.listen_port))
+        self.server_socket.listen(5)
+        print(f"Office {self.node_name} listening on port {self.listen_port} //.....:")
+
+        # Connect to the controller server to obtain the routing tables
+        self.connect_to_server()
+
+        # Listen for incoming connections from other nodes in separate threads
+        threading.Thread(target=self.accept_connections).start()
+
+    def server_request(self, request):
+        """
+        Builds an authenticated request for the controller server.
+
+        The node authenticates with RSA only when it has no valid session token; every
+        other request is signed with the token.
+
+        Parameters:
+        - request (str): The request, e.g. the node name or a subscription.
+
+        Returns:
+        - bytes: The signed request.
+        """
+        if self.session_token is None or not self.session_token.is_valid():
+            self.session_token = session_auth.request_token((self.server_host, self.server_port),
+                                                            self.node_name, public_key)
+        return self.session_token.sign(request)
+
+    def connect_to_server(self):
+        """
+        Connects to the controller server to obtain the routing table.
+
+        This method establishes a connection to the controller server, sends the
+        node name signed with the session token, and receives the routing table.
+        """
+        try:
+            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client_socket.connect((self.server_host, self.server_port))
+            client_socket.sendall(self.server_request(self.node_name))
+            routing_table_json = client_socket.recv(4096).decode()
+            if not routing_table_json:
+                # The controller rejected the token, e.g. after a restart
+                self.session_token = None
+            # Save the received routing table
+            self.routing_table = json.loads(routing_table_json)
+            client_socket.close()
+        except Exception as e:
+            print(f"Error while connecting to server: {e}")
+
+    def subscribe_to_server(self, retry_interval):
+        """
+        Subscribes to the controller server to receive routing table updates.
+
+        This method keeps a single long-lived connection to the controller server,
+        which pushes the routing table right away and then only the destinations that
+        changed, acknowledging each update with the version it applied. If the connection
+        is lost, the node subscribes again after retry_interval seconds.
+
+        Parameters:
+        - retry_interval (float): Seconds to wait before subscribing again.
+        """
+        while True:
+            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                client_socket.connect((self.server_host, self.server_port))
+                request = routing_protocol.SUBSCRIBE_PREFIX + self.node_name
+                client_socket.sendall(self.server_request(request))
+                updates = 0
+                while True:
+                    update_json = routing_protocol.recv_update(client_socket)
+                    if update_json is None:
+                        break
+                    updates += 1
+                    # Apply the pushed update to the routing table
+                    self.routing_table, self.routing_table_version = routing_protocol.apply_update(
+                        self.routing_table, self.routing_table_version, update_json)
+                    routing_protocol.send_ack(client_socket, self.routing_table_version)
+                if not updates:
+                    # The controller rejected the token, e.g. after a restart
+                    self.session_token = None
+                print("Subscription closed by the controller.")
+            except Exception as e:
+                print(f"Error while subscribed to server: {e}")
+            finally:
+                client_socket.close()
+            time.sleep(retry_interval)
+
+    def accept_connections(self):
+        """
+        Accepts incoming connections from other nodes.
+
+        This method runs in a separate thread and continuously accepts incoming
+        connections, creating a new thread to handle each connection.
+        """
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+                print(f"Node {self.node_name} accepted connection from {client_address}")
+                threading.Thread(target=self.handle_client, args=(client_socket,)).start()
+            except Exception as e:
+                print(f"Error accepting connection: {e}")
+
+    def handle_client(self, client_socket):
+        """
+        Handles incoming messages from other nodes.
+
+        This method receives the frames sent by connected nodes, forwards each
+        frame as soon as it is complete, and closes the connection when the other
+        end does. Only the frame header is parsed: the encrypted payload is sent
+        on without being decoded or copied. Frames larger than cut_through_size are
+        forwarded as soon as their header arrives, while the rest is still coming.
+
+        Parameters:
+        - client_socket (socket.socket): The socket connected to the client.
+        """
+        try:
+            # A connection may carry several frames, each one is forwarded as it completes
+            for frame in framing.recv_frames(client_socket, cut_through_size=self.cut_through_size):
+                print(f"Received user message from {frame.origin} to {frame.destination}")
+                self.route_message(frame.destination, frame)
+
+        except Exception as e:
+            print(f"Error handling client: {e}")
+        finally:
+            client_socket.close()
+
+    def route_message(self, destination_node_name, frame):
+        """
+        Routes frames to their destination based on the routing table.
+
+        This method determines the next hop for the frame based on the routing
+        table and queues the frame, exactly as it was received, to be sent to the
+        next hop.
+
+        Parameters:
+        - destination_node_name (str): The name of the destination node.
+        - frame (framing.Frame): The frame to be routed.
+        """
+        # Get the route to the destination node, if it is in the routing table
+        route = routing_protocol.next_hop(self.routing_table, self.node_name, self.port_mapping,
+                                          destination_node_name)
+        if route is not None:
+            # Check if the route is valid
+            if route:
+                # Get the next hop and its output port
+                next_hop, next_hop_port = route
+
+                if next_hop_port is not None:
+                    # Queue the message to be sent to the next hop over its persistent connection
+                    self.send_queues.send((self.host, next_hop_port), frame)
+
+                    print(f"Office {self.node_name} routed message to {destination_node_name} at hop {next_hop}")
+
+                else:
+                    print(f"No outgoing port found for next hop {next_hop}.")
+            else:
+                # If the current node is the destination node,
+                # send the message back to the receiving client
+                print(f"The Office {self.node_name} is the destination... the message was sent to the client.")
+                self.send_queues.send((self.host, self.client_port), frame)
+        else:
+            print(f"No route found to {destination_node_name}")
+
+
+def load_office_config(node_name):
+    """
+    Gets the identity of an office from the topology.
+
+    The listening port comes from port_mapping.json, the client port from
+    client_port_mapping.json and the outgoing ports are the listening ports of the
+    office's neighbors in the NSFNET topology of nsfnetred.py.
+
+    Parameters:
+    - node_name (str): The name of the office.
+
+    Returns:
+    - dict: The "listen_port", "client_port" and "outgoing_ports" of the office.
+    """
+    from nsfnetred import network
+
+    with open("port_mapping.json", "r") as file:
+        port_mapping = json.load(file)
+    with open("client_port_mapping.json", "r") as file:
+        client_port_mapping = json.load(file)
+    if node_name not in port_mapping:
+        raise ValueError(f"Office {node_name} not found in port_mapping.json")
+    neighbors = network.graph.neighbors(node_name) if node_name in network.graph else []
+    return {
+        "listen_port": port_mapping[node_name],
+        "client_port": client_port_mapping.get(node_name),
+        "outgoing_ports": [port_mapping[neighbor] for neighbor in neighbors if neighbor in port_mapping]
+    }
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line of an office.
+
+    Parameters:
+    - argv (list of str): The arguments to parse, sys.argv by default.
+
+    Returns:
+    - argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Run an office of the network.")
+    parser.add_argument("node_name", help="name of the office, e.g. 6.6.6.6")
+    parser.add_argument("--host", default="192.168.1.6", help="address the offices and clients listen on")
+    parser.add_argument("--server-host", default="192.168.1.6", help="address of the controller server")
+    parser.add_argument("--server-port", type=int, default=1234, help="port of the controller server")
+    parser.add_argument("--listen-port", type=int, help="overrides the port from port_mapping.json")
+    parser.add_argument("--client-port", type=int, help="overrides the port from client_port_mapping.json")
+    parser.add_argument("--retry-interval", type=float, default=15,
+                        help="seconds to wait before subscribing again to the controller")
+    parser.add_argument("--cut-through-size", type=int, default=65536,
+                        help="frames larger than this many bytes are forwarded while they are received")
+    parser.add_argument("--queue-depth", type=int, default=1000,
+                        help="maximum number of frames waiting to be sent to each next hop")
+    parser.add_argument("--queue-policy", choices=["block", "drop"], default="block",
+                        help="wait for room or drop the frame when the queue of a next hop is full")
+    parser.add_argument("--batch-delay", type=float, default=0.001,
+                        help="seconds a small frame waits for others to the same next hop, 0 to not wait")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="maximum number of frames sent to a next hop in a single write, 1 to disable batching")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="run the office with a thread per connection or on an asyncio event loop")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = load_office_config(args.node_name)
+    listen_port = args.listen_port or config["listen_port"]
+    client_port = args.client_port or config["client_port"]
+
+    if args.engine == "asyncio":
+        import asyncio
+        from async_office import AsyncTCPNode
+
+        node = AsyncTCPNode(args.node_name, args.server_host, args.server_port, listen_port, client_port, args.host,
+                            cut_through_size=args.cut_through_size)
+        asyncio.run(node.start(args.retry_interval))
+    else:
+        node = TCPNode(args.node_name, args.server_host, args.server_port, listen_port,
+                       config["outgoing_ports"], client_port, args.host, args.cut_through_size,
+                       args.queue_depth, args.queue_policy, args.batch_delay, args.batch_size)
+        node.start()
+        node.subscribe_to_server(args.retry_interval)
@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import json
+from async_office import AsyncTCPNode
+
+
+class OfficeRuntime:
+    """
+    A class to host many offices in a single process and event loop.
+
+    Every office still listens on its own port for traffic from clients and offices
+    hosted elsewhere, but messages between offices of the same runtime are handed over
+    through an in-memory queue instead of a loopback TCP connection.
+
+    Attributes:
+    - offices (dict): The hosted office of each (host, port) address.
+    - inboxes (dict): The queue of messages handed over to each hosted office.
+    - inbox_size (int): The maximum number of messages waiting in an inbox.
+    - dropped (int): The number of messages dropped because an inbox was full.
+
+    Methods:
+    - add_office(node): Hosts an office in the runtime.
+    - is_local(address): Checks whether an address belongs to a hosted office.
+    - handoff(address, frame): Hands a frame over to a hosted office.
+    - run(retry_interval): Starts every hosted office and runs them until cancelled.
+    """
+    def __init__(self, inbox_size=1000):
+        """
+        Initializes an empty runtime.
+
+        Parameters:
+        - inbox_size (int): The maximum number of messages waiting in an inbox. Messages
+          handed over to a full inbox are dropped.
+        """
+        self.offices = {}
+        self.inboxes = {}
+        self.inbox_size = inbox_size
+        self.dropped = 0
+
+    def add_office(self, node):
+        """
+        Hosts an office in the runtime.
+
+        Parameters:
+        - node (AsyncTCPNode): The office to host.
+        """
+        address = (node.host, node.listen_port)
+        node.runtime = self
+        self.offices[address] = node
+
+    def is_local(self, address):
+        """
+        Checks whether an address belongs to a hosted office.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the next hop.
+
+        Returns:
+        - bool: True if the office listening on that address is hosted by the runtime.
+        """
+        return address in self.offices
+
+    async def handoff(self, address, frame):
+        """
+        Hands a frame over to a hosted office.
+
+        The frame is dropped if the inbox of the office is full. Waiting for room would
+        stall the caller, which is often the inbox processor of another hosted office:
+        two offices forwarding to each other with full inboxes would wait on each other
+        forever.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the office.
+        - frame (framing.Frame): The frame to route.
+
+        Returns:
+        - bool: True if the frame was handed over, False if it was dropped.
+        """
+        try:
+            self.inboxes[address].put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Inbox of {address[0]}:{address[1]} full, frame from {frame.origin} dropped.")
+            return False
+        return True
+
+    async def process_inbox(self, node, inbox):
+        """
+        Routes the frames handed over to an office, in arrival order.
+
+        Parameters:
+        - node (AsyncTCPNode): The hosted office.
+        - inbox (asyncio.Queue): The queue of frames handed over to it.
+        """
+        while True:
+            frame = await inbox.get()
+            try:
+                await node.route_message(frame.destination, frame)
+            except Exception as e:
+                print(f"Error handling client: {e}")
+
+    async def run(self, retry_interval=15):
+        """
+        Starts every hosted office and runs them until cancelled.
+
+        Parameters:
+        - retry_interval (float): Seconds to wait before subscribing again after an error.
+        """
+        tasks = []
+        for address, node in self.offices.items():
+            # Queues must be created inside the running event loop
+            self.inboxes[address] = asyncio.Queue(self.inbox_size)
+            tasks.append(asyncio.ensure_future(self.process_inbox(node, self.inboxes[address])))
+            tasks.append(asyncio.ensure_future(node.start(retry_interval)))
+        print(f"Runtime hosting {len(self.offices)} offices.")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def build_runtime(node_names, server_host, server_port, host, port_mapping, client_port_mapping, inbox_size=1000,
+                  cut_through_size=65536):
+    """
+    Builds a runtime hosting the given offices.
+
+    Parameters:
+    - node_names (list of str): The names of the offices to host.
+    - server_host (str): The host address of the controller server.
+    - server_port (int): The port of the controller server.
+    - host (str): The address the offices and clients listen on.
+    - port_mapping (dict): The mapping of node names to ports.
+    - client_port_mapping (dict): The mapping of node names to client ports.
+    - inbox_size (int): The maximum number of messages waiting in an inbox.
+    - cut_through_size (int): The frame size above which frames are forwarded while they arrive.
+
+    Returns:
+    - OfficeRuntime: The runtime with the offices added.
+    """
+    runtime = OfficeRuntime(inbox_size)
+    for node_name in node_names:
+        runtime.add_office(AsyncTCPNode(node_name, server_host, server_port, port_mapping[node_name],
+                                        client_port_mapping.get(node_name), host, port_mapping,
+                                        cut_through_size))
+    return runtime
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many offices in a single process.")
+    parser.add_argument("--offices", nargs="*", help="names of the offices to host, all of the port mapping by default")
+    parser.add_argument("--host", default="192.168.1.6", help="address the offices and clients listen on")
+    parser.add_argument("--server-host", default="192.168.1.6", help="address of the controller server")
+    parser.add_argument("--server-port", type=int, default=1234, help="port of the controller server")
+    parser.add_argument("--port-mapping", default="port_mapping.json", help="file mapping office names to ports")
+    parser.add_argument("--client-port-mapping", default="client_port_mapping.json",
+                        help="file mapping office names to client ports")
+    parser.add_argument("--retry-interval", type=float, default=15,
+                        help="seconds to wait before subscribing again to the controller")
+    parser.add_argument("--cut-through-size", type=int, default=65536,
+                        help="frames larger than this many bytes are forwarded while they are received")
+    args = parser.parse_args()
+
+    with open(args.port_mapping, "r") as file:
+        port_mapping = json.load(file)
+    with open(args.client_port_mapping, "r") as file:
+        client_port_mapping = json.load(file)
+    runtime = build_runtime(args.offices or list(port_mapping), args.server_host, args.server_port, args.host,
+                            port_mapping, client_port_mapping, cut_through_size=args.cut_through_size)
+    asyncio.run(runtime.run(args.retry_interval))
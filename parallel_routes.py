@@ -0,0 +1,245 @@
+import math
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+import all_pairs
+
+# Graph attached by a worker process: the shared memory block, its arrays and node names
+worker_graph = None
+
+
+def graph_layout(node_count, link_count):
+    """
+    Computes where each part of a graph lies in its shared memory block.
+
+    The weights come first so that every array is aligned to its item size.
+
+    Parameters:
+    - node_count (int): The number of node indexes of the graph.
+    - link_count (int): The number of stored links of the graph.
+
+    Returns:
+    - tuple: The byte offsets of the weights, offsets, targets and names.
+    """
+    weights_at = 0
+    offsets_at = weights_at + 8 * link_count
+    targets_at = offsets_at + 4 * (node_count + 1)
+    names_at = targets_at + 4 * link_count
+    return weights_at, offsets_at, targets_at, names_at
+
+
+def read_graph(buffer, node_count, link_count, names_size):
+    """
+    Builds views of the arrays of a graph stored in a shared memory block.
+
+    Parameters:
+    - buffer (memoryview): The buffer of the block.
+    - node_count (int): The number of node indexes of the graph.
+    - link_count (int): The number of stored links of the graph.
+    - names_size (int): The size of the encoded node names.
+
+    Returns:
+    - tuple: The offsets, targets and weights arrays and the list of node names, None
+      for the indexes not in use.
+    """
+    weights_at, offsets_at, targets_at, names_at = graph_layout(node_count, link_count)
+    weights = np.frombuffer(buffer, np.float64, link_count, weights_at)
+    offsets = np.frombuffer(buffer, np.int32, node_count + 1, offsets_at)
+    targets = np.frombuffer(buffer, np.int32, link_count, targets_at)
+    names = [name or None for name in bytes(buffer[names_at:names_at + names_size]).decode().split("\0")]
+    return offsets, targets, weights, names
+
+
+def compute_routes(offsets, targets, weights, names, sources, batch_size):
+    """
+    Computes the shortest paths of some sources over the arrays of a CSR graph.
+
+    Parameters:
+    - offsets (numpy.ndarray): The offsets array of the graph.
+    - targets (numpy.ndarray): The targets array of the graph.
+    - weights (numpy.ndarray): The weights array of the graph.
+    - names (list): The name of the node of each index.
+    - sources (list): The indexes of the source nodes.
+    - batch_size (int): The number of sources relaxed together.
+
+    Returns:
+    - dict: The shortest distance from each source to every reachable node.
+    - dict: The shortest path from each source to every reachable node.
+    """
+    all_distances = {}
+    all_paths = {}
+    for start in range(0, len(sources), batch_size):
+        batch = np.array(sources[start:start + batch_size])
+        distances, predecessors = all_pairs.bellman_ford_csr(offsets, targets, weights, batch)
+        for row, source in enumerate(batch.tolist()):
+            reachable = np.flatnonzero(np.isfinite(distances[row]))
+            all_distances[names[source]] = dict(zip([names[i] for i in reachable],
+                                                    distances[row, reachable].tolist()))
+            all_paths[names[source]] = all_pairs.paths_from_predecessors(names, source, distances[row],
+                                                                         predecessors[row])
+    return all_distances, all_paths
+
+
+def release_graph():
+    """
+    Detaches the graph of a worker process. The arrays must be released before the
+    shared memory block is closed.
+    """
+    global worker_graph
+    if worker_graph is not None:
+        block = worker_graph[1]
+        worker_graph = None
+        block.close()
+
+
+def routes_in_worker(graph, sources, batch_size):
+    """
+    Computes the shortest paths of some sources in a worker process.
+
+    The graph is attached once per published version and reused by the next tasks.
+
+    Parameters:
+    - graph (tuple): The name of the shared memory block holding the graph, its number
+      of node indexes, of stored links and the size of its encoded names.
+    - sources (list): The indexes of the source nodes.
+    - batch_size (int): The number of sources relaxed together.
+
+    Returns:
+    - dict: The shortest distance from each source to every reachable node.
+    - dict: The shortest path from each source to every reachable node.
+    """
+    global worker_graph
+    if worker_graph is None or worker_graph[0] != graph[0]:
+        if worker_graph is None:
+            util.Finalize(None, release_graph, exitpriority=10)
+        release_graph()
+        block = shared_memory.SharedMemory(graph[0])
+        worker_graph = (graph[0], block) + read_graph(block.buf, *graph[1:])
+    return compute_routes(*worker_graph[2:], sources, batch_size)
+
+
+class ParallelRoutes:
+    """
+    A class to compute shortest-path trees in worker processes.
+
+    The trees of different sources are independent, so the sources are split across
+    the processes. The CSR arrays of the graph are copied once into shared memory each
+    time the topology changes, and every task only carries its list of sources.
+
+    Attributes:
+    - processes (int): The number of worker processes, 0 to compute in the calling thread.
+    - batch_size (int): The number of sources relaxed together by a process.
+    - executor (ProcessPoolExecutor): The worker processes, or None until started.
+    - block (SharedMemory): The shared memory block holding the published graph.
+
+    Methods:
+    - start(): Starts the worker processes.
+    - compute(csr, sources): Computes the shortest-path trees of some sources.
+    - publish(csr): Copies the graph into shared memory if it changed.
+    - shutdown(): Stops the worker processes and frees the shared memory.
+    """
+    def __init__(self, processes=0, batch_size=256):
+        """
+        Initializes the pool without starting its processes.
+
+        Parameters:
+        - processes (int): The number of worker processes, 0 to compute in the calling thread.
+        - batch_size (int): The number of sources relaxed together by a process. Each
+          batch holds batch_size rows of candidate distances per link.
+        """
+        self.processes = processes
+        self.batch_size = batch_size
+        self.executor = None
+        self.block = None
+        self.graph = None
+        self.published = None
+
+    def start(self):
+        """
+        Starts the worker processes.
+
+        As with the decryption pool, the processes are spawned rather than forked and
+        all of them are started right away.
+        """
+        if self.processes > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(self.processes, multiprocessing.get_context("spawn"))
+            for started in [self.executor.submit(math.sqrt, 0) for _ in range(self.processes)]:
+                started.result()
+
+    def compute(self, csr, sources):
+        """
+        Computes the shortest-path trees of some sources and merges them.
+
+        Parameters:
+        - csr (CSRGraph): The graph.
+        - sources (iterable): The names of the source nodes.
+
+        Returns:
+        - dict: The shortest distance from each source to every reachable node.
+        - dict: The shortest path from each source to every reachable node.
+
+        Exceptions:
+        - ValueError: If the graph contains a negative weight cycle.
+        """
+        indexes = [csr.index[source] for source in sources]
+        if self.executor is None:
+            return compute_routes(*csr.arrays(), csr.names, indexes, self.batch_size)
+
+        self.publish(csr)
+        chunk_size = max(1, math.ceil(len(indexes) / (self.processes * 4)))
+        tasks = [self.executor.submit(routes_in_worker, self.graph, indexes[start:start + chunk_size],
+                                      self.batch_size)
+                 for start in range(0, len(indexes), chunk_size)]
+        all_distances = {}
+        all_paths = {}
+        for task in tasks:
+            distances, paths = task.result()
+            all_distances.update(distances)
+            all_paths.update(paths)
+        return all_distances, all_paths
+
+    def publish(self, csr):
+        """
+        Copies the graph into a new shared memory block if it changed since the last
+        time, and frees the previous block.
+
+        Parameters:
+        - csr (CSRGraph): The graph.
+        """
+        offsets, targets, weights = csr.arrays()
+        if self.published is not None and self.published[0] is offsets and self.published[1] == csr.names:
+            return
+        names = "\0".join(name or "" for name in csr.names).encode()
+        node_count, link_count = len(offsets) - 1, len(targets)
+        weights_at, offsets_at, targets_at, names_at = graph_layout(node_count, link_count)
+        block = shared_memory.SharedMemory(create=True, size=max(1, names_at + len(names)))
+        np.frombuffer(block.buf, np.float64, link_count, weights_at)[:] = weights
+        np.frombuffer(block.buf, np.int32, node_count + 1, offsets_at)[:] = offsets
+        np.frombuffer(block.buf, np.int32, link_count, targets_at)[:] = targets
+        block.buf[names_at:names_at + len(names)] = names
+        self.free_block()
+        self.block = block
+        self.graph = (block.name, node_count, link_count, len(names))
+        self.published = (offsets, list(csr.names))
+
+    def free_block(self):
+        """
+        Frees the shared memory block of the published graph. Workers still attached to
+        it keep their mapping until they attach the next one.
+        """
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+            self.graph = None
+            self.published = None
+
+    def shutdown(self):
+        """
+        Stops the worker processes and frees the shared memory.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.free_block()
@@ -0,0 +1,237 @@
+import json
+import struct
+
+# Prefix of the encrypted request an office sends to subscribe to routing table updates
+SUBSCRIBE_PREFIX = "subscribe:"
+
+# Every update pushed over a subscription is preceded by its length
+LENGTH_HEADER = struct.Struct('!I')
+
+# Nodes acknowledge every update with the version of the routing table they hold
+ACK_HEADER = struct.Struct('!I')
+
+
+def send_update(sock, payload):
+    """
+    Sends a routing table update over a subscription connection.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+    - payload (bytes): The serialized update.
+    """
+    sock.sendall(LENGTH_HEADER.pack(len(payload)) + payload)
+
+
+def recv_exactly(sock, size):
+    """
+    Receives exactly size bytes from a socket.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+    - size (int): The number of bytes to receive.
+
+    Returns:
+    - bytes: The received bytes.
+    - None: If the connection was closed before size bytes arrived.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def recv_update(sock):
+    """
+    Receives a routing table update over a subscription connection.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+
+    Returns:
+    - bytes: The serialized update.
+    - None: If the connection was closed.
+    """
+    header = recv_exactly(sock, LENGTH_HEADER.size)
+    if header is None:
+        return None
+    (length,) = LENGTH_HEADER.unpack(header)
+    return recv_exactly(sock, length)
+
+
+def send_ack(sock, version):
+    """
+    Acknowledges the routing table version a node now holds.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+    - version (int): The version of the routing table held by the node.
+    """
+    sock.sendall(ACK_HEADER.pack(version))
+
+
+def recv_ack(sock):
+    """
+    Receives the acknowledgement of a routing table update.
+
+    Parameters:
+    - sock (socket.socket): The connected socket.
+
+    Returns:
+    - int: The version of the routing table held by the node.
+    - None: If the connection was closed.
+    """
+    ack = recv_exactly(sock, ACK_HEADER.size)
+    if ack is None:
+        return None
+    (version,) = ACK_HEADER.unpack(ack)
+    return version
+
+
+def full_update(version, routing_table_bytes):
+    """
+    Builds an update carrying a full snapshot of a routing table.
+
+    Parameters:
+    - version (int): The version of the routing table.
+    - routing_table_bytes (bytes): The routing table already serialized as JSON.
+
+    Returns:
+    - bytes: The serialized update.
+    """
+    return b'{"version":%d,"full":true,"routes":%s}' % (version, routing_table_bytes)
+
+
+def delta_update(version, routing_table, base_version, base_table):
+    """
+    Builds an update carrying only the destinations that changed since a base version.
+
+    Parameters:
+    - version (int): The version of the routing table.
+    - routing_table (dict): The routing table at that version.
+    - base_version (int): The version the node acknowledged.
+    - base_table (dict): The routing table at the acknowledged version.
+
+    Returns:
+    - bytes: The serialized update.
+    - None: If a full snapshot would be smaller than the delta.
+    """
+    routes = {destination: path for destination, path in routing_table.items()
+              if base_table.get(destination) != path}
+    removed = [destination for destination in base_table if destination not in routing_table]
+    if len(routes) + len(removed) > len(routing_table) // 2:
+        return None
+    update = {"version": version, "base": base_version, "routes": routes, "removed": removed}
+    return json.dumps(update, separators=(',', ':')).encode()
+
+
+def apply_update(routing_table, routing_table_version, update_json):
+    """
+    Applies a routing table update in place.
+
+    Parameters:
+    - routing_table (dict): The routing table held by the node, or None.
+    - routing_table_version (int): The version of that routing table.
+    - update_json (bytes): The serialized update.
+
+    Returns:
+    - tuple: The updated routing table and its version. They are returned unchanged
+      when the delta does not apply to the version held by the node.
+    """
+    update = json.loads(update_json)
+    if update.get("full"):
+        return update["routes"], update["version"]
+    if routing_table is None or update["base"] != routing_table_version:
+        print(f"Routing table update {update['version']} does not apply to version {routing_table_version}.")
+        return routing_table, routing_table_version
+    for destination in update["removed"]:
+        routing_table.pop(destination, None)
+    routing_table.update(update["routes"])
+    return routing_table, update["version"]
+
+
+def next_hop(routing_table, node_name, port_mapping, destination):
+    """
+    Finds the next hop towards a destination in the routing table of an office.
+
+    Path tables hold the whole path starting at the office, while next-hop forwarding
+    tables hold the next hop and its port already resolved.
+
+    Parameters:
+    - routing_table (dict): The routing table of the office, or None if it has none yet.
+    - node_name (str): The name of the office.
+    - port_mapping (dict): The mapping of node names to ports.
+    - destination (str): The name of the destination node.
+
+    Returns:
+    - list: The next hop and its port, None if the port is unknown, or an empty list if
+      the office is the destination.
+    - None: If there is no route to the destination.
+    """
+    if routing_table is None or destination not in routing_table:
+        return None
+    route = routing_table[destination]
+    if route and route[0] == node_name:
+        route = [route[1], port_mapping.get(route[1])] if len(route) > 1 else []
+    return route
+
+
+def next_hop_table(paths, port_mapping):
+    """
+    Builds a next-hop forwarding table from the shortest paths of a node.
+
+    Each destination maps to its next hop and the port of that next hop, or to an empty
+    entry for the node itself, so offices hold a single hop per destination instead of
+    the whole path.
+
+    Parameters:
+    - paths (dict): The shortest path from the node to every destination.
+    - port_mapping (dict): The mapping of node names to ports.
+
+    Returns:
+    - dict: The forwarding table of the node.
+    """
+    forwarding_table = {}
+    for destination, path in paths.items():
+        if len(path) > 1:
+            forwarding_table[destination] = [path[1], port_mapping.get(path[1])]
+        else:
+            forwarding_table[destination] = []
+    return forwarding_table
+
+
+def path_from_routing_tables(routing_tables, source, destination):
+    """
+    Gets the path between two nodes from the routing tables of every node.
+
+    Works with both path tables, whose entries start with the source node itself, and
+    next-hop forwarding tables; for the latter the path is rebuilt by following the next
+    hops.
+
+    Parameters:
+    - routing_tables (dict): The routing table of every node.
+    - source (str): The name of the source node.
+    - destination (str): The name of the destination node.
+
+    Returns:
+    - list: The path from source to destination.
+    - None: If there is no route between them.
+    """
+    if destination not in routing_tables.get(source, {}):
+        return None
+    entry = routing_tables[source][destination]
+    if not entry:
+        return [source]
+    if entry[0] == source:
+        return entry
+    path = [source]
+    while path[-1] != destination and len(path) <= len(routing_tables):
+        entry = routing_tables.get(path[-1], {}).get(destination)
+        if not entry:
+            return None
+        path.append(entry[0])
+    return path
@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+import framing
+
+# What to do with a frame when the queue of its next hop is full
+POLICIES = ("block", "drop")
+
+
+class NextHopQueue:
+    """
+    A class to represent the frames waiting to be sent to a next hop.
+
+    A dedicated thread sends the frames in order over the pooled connection, so a slow
+    or dead next hop only holds up the frames going to it.
+
+    Attributes:
+    - address (tuple): The (host, port) address of the next hop.
+    - frames (queue.Queue): The frames waiting to be sent, bounded by the queue depth.
+    - dropped (int): The number of frames dropped because the queue was full.
+    - failed (int): The number of frames that could not be sent.
+    """
+    def __init__(self, address, depth):
+        """
+        Initializes an empty queue.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the next hop.
+        - depth (int): The maximum number of frames waiting to be sent.
+        """
+        self.address = address
+        self.frames = queue.Queue(depth)
+        self.dropped = 0
+        self.failed = 0
+
+
+class SendQueues:
+    """
+    A class to send the frames of an office through bounded per-next-hop queues.
+
+    With the "block" policy, a thread routing a frame to a full queue waits for room,
+    which stops it from reading its connection and pushes back on the upstream office
+    through TCP flow control. With the "drop" policy the frame is dropped instead.
+
+    Small frames waiting for the same next hop are sent together in a single write. A
+    frame waits at most batch_delay seconds for others to join it.
+
+    Attributes:
+    - connection_pool (ConnectionPool): The persistent connections to the next hops.
+    - depth (int): The maximum number of frames waiting for each next hop.
+    - policy (str): "block" or "drop", applied when a queue is full.
+    - batch_delay (float): The maximum number of seconds a frame waits for others to join it.
+    - batch_size (int): The maximum number of frames sent in a single write.
+    - batch_bytes (int): The maximum number of bytes sent in a single write.
+    - queues (dict): The queue of each (host, port) address.
+
+    Methods:
+    - send(address, frame): Queues a frame to be sent to an address.
+    - send_loop(next_hop_queue): Sends the frames of a queue until the office stops.
+    - collect_batch(next_hop_queue, item): Gathers the frames to send together with a frame.
+    """
+    def __init__(self, connection_pool, depth=1000, policy="block", batch_delay=0.001, batch_size=64,
+                 batch_bytes=65536):
+        """
+        Initializes the queues, which are created on first use.
+
+        Parameters:
+        - connection_pool (ConnectionPool): The persistent connections to the next hops.
+        - depth (int): The maximum number of frames waiting for each next hop.
+        - policy (str): "block" or "drop", applied when a queue is full.
+        - batch_delay (float): The maximum number of seconds a frame waits for others to
+          join it, 0 to only batch the frames already waiting.
+        - batch_size (int): The maximum number of frames sent in a single write, 1 to
+          disable batching.
+        - batch_bytes (int): The maximum number of bytes sent in a single write.
+
+        Exceptions:
+        - ValueError: If the policy is unknown.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.connection_pool = connection_pool
+        self.depth = depth
+        self.policy = policy
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def send(self, address, frame):
+        """
+        Queues a frame to be sent to an address.
+
+        Streamed frames are read from the upstream connection while they are sent, so
+        the caller waits until the frame has been forwarded before reading the next one.
+
+        Parameters:
+        - address (tuple): The (host, port) address of the next hop.
+        - frame (framing.Frame): The frame to send.
+
+        Returns:
+        - bool: True if the frame was queued, False if it was dropped.
+        """
+        with self.lock:
+            next_hop_queue = self.queues.get(address)
+            if next_hop_queue is None:
+                next_hop_queue = self.queues[address] = NextHopQueue(address, self.depth)
+                threading.Thread(target=self.send_loop, args=(next_hop_queue,), daemon=True).start()
+
+        done = threading.Event() if isinstance(frame, framing.StreamedFrame) else None
+        if self.policy == "block":
+            next_hop_queue.frames.put((frame, done))
+        else:
+            try:
+                next_hop_queue.frames.put_nowait((frame, done))
+            except queue.Full:
+                next_hop_queue.dropped += 1
+                print(f"Queue to {address[0]}:{address[1]} full, frame from {frame.origin} dropped.")
+                return False
+        if done is not None:
+            done.wait()
+        return True
+
+    def send_loop(self, next_hop_queue):
+        """
+        Sends the frames of a queue until the office stops.
+
+        Parameters:
+        - next_hop_queue (NextHopQueue): The queue to send.
+        """
+        item = None
+        while True:
+            if item is None:
+                item = next_hop_queue.frames.get()
+            batch, item = self.collect_batch(next_hop_queue, item)
+            try:
+                if len(batch) == 1:
+                    self.connection_pool.send_chunks(next_hop_queue.address, batch[0][0].chunks())
+                else:
+                    self.connection_pool.send(next_hop_queue.address, b''.join(frame.data for frame, _ in batch))
+            except Exception as e:
+                next_hop_queue.failed += len(batch)
+                print(f"Error sending frame to {next_hop_queue.address[0]}:{next_hop_queue.address[1]}: {e}")
+            finally:
+                for _, done in batch:
+                    if done is not None:
+                        done.set()
+
+    def collect_batch(self, next_hop_queue, item):
+        """
+        Gathers the frames to send together with a frame.
+
+        Streamed frames and frames of batch_bytes or more are always sent alone.
+
+        Parameters:
+        - next_hop_queue (NextHopQueue): The queue the frame was taken from.
+        - item (tuple): The first frame of the batch and its completion event.
+
+        Returns:
+        - tuple: The list of (frame, event) items of the batch, and the item taken from
+          the queue that did not fit in it, or None.
+        """
+        batch = [item]
+        frame, done = item
+        size = len(frame.data)
+        if done is not None or size >= self.batch_bytes:
+            return batch, None
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    item = next_hop_queue.frames.get(timeout=timeout)
+                else:
+                    item = next_hop_queue.frames.get_nowait()
+            except queue.Empty:
+                break
+            frame, done = item
+            if done is not None or size + len(frame.data) > self.batch_bytes:
+                return batch, item
+            batch.append(item)
+            size += len(frame.data)
+        return batch, None
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import socket
+import struct
+import threading
+import time
+import rsa
+import routing_protocol
+
+# Requests starting with this prefix ask for a session token, they carry the key of the
+# session and are the only ones encrypted with RSA
+AUTH_PREFIX = "auth:"
+
+# Authenticated requests start with a header: magic, token id and timestamp, followed by
+# the MAC of the header and the request
+TOKEN_MAGIC = b'TK'
+TOKEN_HEADER = struct.Struct('!2s8sd')
+TOKEN_ID_SIZE = 8
+KEY_SIZE = 16
+MAC_SIZE = 16
+
+# Reply to a token request: the token id and its lifetime in seconds
+TOKEN_REPLY = struct.Struct('!8sI')
+
+
+def compute_mac(key, data):
+    """
+    Computes the MAC of an authenticated request.
+
+    Parameters:
+    - key (bytes): The key of the session.
+    - data (bytes): The header and the request.
+
+    Returns:
+    - bytes: The truncated HMAC-SHA256 of the data.
+    """
+    return hmac.new(key, data, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def encrypt_auth_request(node_name, key, public_key):
+    """
+    Builds the RSA-encrypted request for a session token.
+
+    Parameters:
+    - node_name (str): The name of the node asking for the token.
+    - key (bytes): The key the node chose for the session.
+    - public_key (rsa.PublicKey): The public key of the controller server.
+
+    Returns:
+    - bytes: The encrypted request.
+    """
+    return rsa.encrypt(f"{AUTH_PREFIX}{node_name}:{key.hex()}".encode(), public_key)
+
+
+def request_token(server_address, node_name, public_key, timeout=10):
+    """
+    Authenticates a node with RSA and obtains a session token.
+
+    Parameters:
+    - server_address (tuple): The (host, port) address of the controller server.
+    - node_name (str): The name of the node.
+    - public_key (rsa.PublicKey): The public key of the controller server.
+    - timeout (float): Seconds to wait for the controller server.
+
+    Returns:
+    - SessionToken: The token to sign the next requests with.
+
+    Exceptions:
+    - OSError: If the controller server could not be reached or did not grant a token.
+    """
+    key = os.urandom(KEY_SIZE)
+    with socket.create_connection(server_address, timeout=timeout) as sock:
+        sock.sendall(encrypt_auth_request(node_name, key, public_key))
+        reply = routing_protocol.recv_exactly(sock, TOKEN_REPLY.size)
+    if reply is None:
+        raise ConnectionError("The controller server did not grant a session token")
+    return SessionToken.from_reply(key, reply)
+
+
+async def request_token_async(server_address, node_name, public_key, timeout=10):
+    """
+    Authenticates a node with RSA and obtains a session token, like request_token but
+    over asyncio streams.
+
+    Parameters:
+    - server_address (tuple): The (host, port) address of the controller server.
+    - node_name (str): The name of the node.
+    - public_key (rsa.PublicKey): The public key of the controller server.
+    - timeout (float): Seconds to wait for the controller server.
+
+    Returns:
+    - SessionToken: The token to sign the next requests with.
+
+    Exceptions:
+    - OSError: If the controller server could not be reached or did not grant a token.
+    """
+    key = os.urandom(KEY_SIZE)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(*server_address), timeout)
+    try:
+        writer.write(encrypt_auth_request(node_name, key, public_key))
+        reply = await asyncio.wait_for(reader.readexactly(TOKEN_REPLY.size), timeout)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("The controller server did not grant a session token")
+    finally:
+        writer.close()
+    return SessionToken.from_reply(key, reply)
+
+
+class SessionToken:
+    """
+    A class to sign the requests of a node with its session key.
+
+    Attributes:
+    - token_id (bytes): The identifier of the session.
+    - key (bytes): The key of the session.
+    - expires_at (float): The monotonic time after which a new token must be requested.
+
+    Methods:
+    - from_reply(key, reply): Builds a token from the reply of the controller server.
+    - is_valid(): Checks whether the token can still be used.
+    - sign(request): Builds an authenticated request.
+    """
+    def __init__(self, token_id, key, lifetime):
+        """
+        Initializes the token.
+
+        Parameters:
+        - token_id (bytes): The identifier of the session.
+        - key (bytes): The key of the session.
+        - lifetime (float): Seconds the token is valid for. It is renewed a little
+          before, so that requests do not reach the controller with an expired token.
+        """
+        self.token_id = token_id
+        self.key = key
+        self.expires_at = time.monotonic() + lifetime * 0.9
+
+    @classmethod
+    def from_reply(cls, key, reply):
+        """
+        Builds a token from the reply of the controller server.
+
+        Parameters:
+        - key (bytes): The key sent in the token request.
+        - reply (bytes): The reply of the controller server.
+
+        Returns:
+        - SessionToken: The granted token.
+        """
+        token_id, lifetime = TOKEN_REPLY.unpack(reply)
+        return cls(token_id, key, lifetime)
+
+    def is_valid(self):
+        """
+        Checks whether the token can still be used.
+
+        Returns:
+        - bool: True if the token has not expired.
+        """
+        return time.monotonic() < self.expires_at
+
+    def sign(self, request):
+        """
+        Builds an authenticated request.
+
+        Parameters:
+        - request (str): The request, e.g. the node name or a subscription.
+
+        Returns:
+        - bytes: The header, the MAC and the request.
+        """
+        header = TOKEN_HEADER.pack(TOKEN_MAGIC, self.token_id, time.time())
+        body = request.encode()
+        return header + compute_mac(self.key, header + body) + body
+
+
+class SessionAuthority:
+    """
+    A class to grant and check the session tokens of the nodes.
+
+    A node authenticates once with RSA, and the controller then only checks the MAC of
+    its requests, which costs far less than an RSA private-key operation.
+
+    Attributes:
+    - lifetime (int): Seconds a token is valid for.
+    - max_skew (float): The maximum age of an authenticated request, in seconds.
+    - sessions (dict): The node name, key and expiry of each token id.
+    - node_tokens (dict): The current token id of each node.
+
+    Methods:
+    - grant(request): Grants a token for a decrypted token request.
+    - verify(data): Checks an authenticated request.
+    """
+    def __init__(self, lifetime=3600, max_skew=60):
+        """
+        Initializes the authority without sessions.
+
+        Parameters:
+        - lifetime (int): Seconds a token is valid for.
+        - max_skew (float): The maximum age of an authenticated request, in seconds.
+        """
+        self.lifetime = lifetime
+        self.max_skew = max_skew
+        self.sessions = {}
+        self.node_tokens = {}
+        self.lock = threading.Lock()
+
+    def grant(self, request):
+        """
+        Grants a token for a decrypted token request, replacing the previous token of the node.
+
+        Parameters:
+        - request (str): The decrypted request, starting with AUTH_PREFIX.
+
+        Returns:
+        - bytes: The reply to send to the node.
+
+        Exceptions:
+        - ValueError: If the request is malformed.
+        """
+        node_name, key_hex = request[len(AUTH_PREFIX):].rsplit(":", 1)
+        key = bytes.fromhex(key_hex)
+        if len(key) != KEY_SIZE:
+            raise ValueError("Invalid session key")
+        token_id = os.urandom(TOKEN_ID_SIZE)
+        with self.lock:
+            self.sessions.pop(self.node_tokens.get(node_name), None)
+            self.sessions[token_id] = (node_name, key, time.monotonic() + self.lifetime)
+            self.node_tokens[node_name] = token_id
+        return TOKEN_REPLY.pack(token_id, self.lifetime)
+
+    def verify(self, data):
+        """
+        Checks an authenticated request.
+
+        A token only authenticates requests about its own node. RSA ciphertexts are
+        random bytes and start with TOKEN_MAGIC once in 65536, so data whose token id was
+        never granted is taken for an RSA-encrypted request rather than rejected.
+
+        Parameters:
+        - data (bytes): The received request.
+
+        Returns:
+        - str: The request, if it carries a valid token.
+        - None: If it is not an authenticated request or its token id is unknown.
+
+        Exceptions:
+        - PermissionError: If the token is expired or does not match the request.
+        """
+        if not data.startswith(TOKEN_MAGIC) or len(data) < TOKEN_HEADER.size + MAC_SIZE:
+            return None
+        _, token_id, timestamp = TOKEN_HEADER.unpack_from(data)
+        with self.lock:
+            session = self.sessions.get(token_id)
+        if session is None:
+            return None
+        if time.monotonic() > session[2]:
+            raise PermissionError("Expired session token")
+        node_name, key, _ = session
+        mac = data[TOKEN_HEADER.size:TOKEN_HEADER.size + MAC_SIZE]
+        body = data[TOKEN_HEADER.size + MAC_SIZE:]
+        if not hmac.compare_digest(mac, compute_mac(key, data[:TOKEN_HEADER.size] + body)):
+            raise PermissionError("Invalid request MAC")
+        if abs(time.time() - timestamp) > self.max_skew:
+            raise PermissionError("Stale authenticated request")
+        request = body.decode()
+        if request not in (node_name, routing_protocol.SUBSCRIBE_PREFIX + node_name):
+            raise PermissionError(f"Token of {node_name} used for another node")
+        return request
@@ -0,0 +1,193 @@
+import os
+import struct
+import threading
+import time
+import rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Audio chunks start with the session they belong to and their sequence number,
+# which is also used as the AES-GCM nonce
+CHUNK_HEADER = struct.Struct('!8sQ')
+# Key messages start with the session and the size of its chunks, so that the
+# receiver knows where each chunk goes in the file
+SESSION_HEADER = struct.Struct('!8sI')
+SESSION_ID_SIZE = 8
+KEY_SIZE = 256
+
+
+class SessionEncryptor:
+    """
+    A class to encrypt the chunks of a transfer with a per-session symmetric key.
+
+    RSA is only used once, to encrypt the session key for the receiver. Every chunk is
+    then encrypted with AES-GCM, which also authenticates it.
+
+    Attributes:
+    - session_id (bytes): The random identifier of the session.
+    - chunk_size (int): The size of every chunk but the last one.
+    - sequence (int): The sequence number of the next chunk.
+
+    Methods:
+    - key_message(): Builds the payload carrying the encrypted session key.
+    - encrypt(chunk): Encrypts the next chunk of the transfer.
+    """
+    def __init__(self, public_key, chunk_size):
+        """
+        Initializes a session with a new random key.
+
+        Parameters:
+        - public_key (rsa.PublicKey): The public key of the receiver.
+        - chunk_size (int): The size of every chunk but the last one.
+        """
+        key = AESGCM.generate_key(bit_length=KEY_SIZE)
+        self.aead = AESGCM(key)
+        self.session_id = os.urandom(SESSION_ID_SIZE)
+        self.chunk_size = chunk_size
+        self.encrypted_key = rsa.encrypt(key, public_key)
+        self.sequence = 0
+
+    def key_message(self):
+        """
+        Builds the payload carrying the encrypted session key.
+
+        Returns:
+        - bytes: The session identifier and chunk size followed by the RSA-encrypted key.
+        """
+        return SESSION_HEADER.pack(self.session_id, self.chunk_size) + self.encrypted_key
+
+    def encrypt(self, chunk):
+        """
+        Encrypts the next chunk of the transfer.
+
+        Parameters:
+        - chunk (bytes): The plain chunk.
+
+        Returns:
+        - bytes: The chunk header followed by the encrypted and authenticated chunk.
+        """
+        header = CHUNK_HEADER.pack(self.session_id, self.sequence)
+        nonce = self.sequence.to_bytes(12, 'big')
+        self.sequence += 1
+        return header + self.aead.encrypt(nonce, chunk, header)
+
+
+class SessionKeyring:
+    """
+    A class to decrypt the chunks of the sessions received by a client.
+
+    Chunks that arrive before the key of their session are kept until it arrives, up to
+    max_pending chunks per session and max_pending_sessions unknown sessions. Chunks
+    beyond those limits are dropped, and the chunks of a session whose key does not
+    arrive within pending_timeout seconds are forgotten.
+
+    Attributes:
+    - private_key (rsa.PrivateKey): The private key used to decrypt session keys.
+    - sessions (dict): The cipher of each known session.
+    - pending (dict): The time the first chunk arrived and the chunks waiting for the
+      key of each unknown session.
+    - max_pending (int): The maximum number of chunks kept per unknown session.
+    - max_pending_sessions (int): The maximum number of unknown sessions kept.
+    - pending_timeout (float): Seconds the chunks of an unknown session are kept.
+    - dropped (int): The number of chunks dropped while waiting for their key.
+
+    Methods:
+    - add_session(payload): Registers a session from its key message.
+    - remove_session(session_id): Forgets a finished session.
+    - decrypt(payload): Decrypts a chunk of a session.
+    """
+    def __init__(self, private_key, max_pending=1024, max_pending_sessions=64, pending_timeout=60):
+        """
+        Initializes an empty keyring.
+
+        Parameters:
+        - private_key (rsa.PrivateKey): The private key used to decrypt session keys.
+        - max_pending (int): The maximum number of chunks kept per unknown session.
+        - max_pending_sessions (int): The maximum number of unknown sessions kept.
+        - pending_timeout (float): Seconds the chunks of an unknown session are kept.
+        """
+        self.private_key = private_key
+        self.sessions = {}
+        self.pending = {}
+        self.max_pending = max_pending
+        self.max_pending_sessions = max_pending_sessions
+        self.pending_timeout = pending_timeout
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add_session(self, payload):
+        """
+        Registers a session from its key message.
+
+        Parameters:
+        - payload (bytes): The session identifier and chunk size followed by the RSA-encrypted key.
+
+        Returns:
+        - tuple: The session identifier, its chunk size and the list of chunks of the session
+          that arrived before its key, decrypted as returned by decrypt().
+        """
+        session_id, chunk_size = SESSION_HEADER.unpack_from(payload)
+        key = rsa.decrypt(payload[SESSION_HEADER.size:], self.private_key)
+        with self.lock:
+            self.sessions[session_id] = AESGCM(key)
+            _, pending = self.pending.pop(session_id, (None, []))
+        return session_id, chunk_size, [self.decrypt(chunk) for chunk in pending]
+
+    def remove_session(self, session_id):
+        """
+        Forgets a finished session.
+
+        Parameters:
+        - session_id (bytes): The identifier of the session.
+        """
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            self.pending.pop(session_id, None)
+
+    def decrypt(self, payload):
+        """
+        Decrypts a chunk of a session.
+
+        Parameters:
+        - payload (bytes): The chunk header followed by the encrypted chunk.
+
+        Returns:
+        - tuple: The session identifier, the sequence number and the plain chunk.
+        - None: If the key of the session has not arrived yet; the chunk is kept, or
+          dropped if too many chunks are already waiting.
+
+        Exceptions:
+        - cryptography.exceptions.InvalidTag: If the chunk was tampered with.
+        """
+        session_id, sequence = CHUNK_HEADER.unpack_from(payload)
+        with self.lock:
+            aead = self.sessions.get(session_id)
+            if aead is None:
+                self.keep_pending(session_id, payload)
+                return None
+        header = payload[:CHUNK_HEADER.size]
+        chunk = aead.decrypt(sequence.to_bytes(12, 'big'), payload[CHUNK_HEADER.size:], header)
+        return session_id, sequence, chunk
+
+    def keep_pending(self, session_id, payload):
+        """
+        Keeps a chunk until the key of its session arrives, or drops it if too many
+        chunks are waiting. Must be called with the lock held.
+
+        Parameters:
+        - session_id (bytes): The identifier of the session.
+        - payload (bytes): The chunk header followed by the encrypted chunk.
+        """
+        now = time.monotonic()
+        for expired in [pending_id for pending_id, (first_seen, _) in self.pending.items()
+                        if now - first_seen > self.pending_timeout]:
+            del self.pending[expired]
+        if session_id not in self.pending and len(self.pending) >= self.max_pending_sessions:
+            self.dropped += 1
+            print("Too many sessions waiting for their key, chunk dropped.")
+            return
+        _, pending = self.pending.setdefault(session_id, (now, []))
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+            print("Too many chunks waiting for their session key, chunk dropped.")
+            return
+        pending.append(payload)
@@ -0,0 +1,236 @@
+import math
+import threading
+import time
+
+
+class TimerHandle:
+    """
+    A class to represent a callback scheduled on a timing wheel.
+
+    Attributes:
+    - deadline (int): The tick at which the callback runs.
+    - callback (callable): The function to call.
+    - args (tuple): The arguments of the callback.
+    - interval (float): The seconds between two runs of a periodic callback, or None.
+    - slot (set): The slot of the wheel holding the timer, or None once it left the wheel.
+    - cancelled (bool): Whether the timer was cancelled.
+    """
+    def __init__(self, deadline, callback, args, interval=None):
+        """
+        Initializes a timer that is not in the wheel yet.
+
+        Parameters:
+        - deadline (int): The tick at which the callback runs.
+        - callback (callable): The function to call.
+        - args (tuple): The arguments of the callback.
+        - interval (float): The seconds between two runs of a periodic callback, or None.
+        """
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.slot = None
+        self.cancelled = False
+
+
+class TimingWheel:
+    """
+    A class to run many timers on a single thread with a hierarchical timing wheel.
+
+    Every level of the wheel has the same number of slots; a slot of level 0 lasts one
+    tick, and a slot of each next level lasts as long as a whole turn of the previous
+    one. A timer is put in the lowest level that reaches its deadline and moves down a
+    level each time the slot holding it comes up, so scheduling and cancelling a timer
+    take constant time no matter how many timers there are.
+
+    Callbacks run on the thread of the wheel and should be short; long jobs should be
+    handed over to another thread.
+
+    Attributes:
+    - tick (float): The duration of a tick in seconds.
+    - slots (int): The number of slots of each level.
+    - levels (list of list of set): The timers of each slot of each level.
+    - current_tick (int): The number of ticks elapsed since the wheel started.
+
+    Methods:
+    - start(): Starts the thread of the wheel.
+    - stop(): Stops the thread of the wheel.
+    - schedule(delay, callback, *args): Runs a callback once after a delay.
+    - schedule_periodic(interval, callback, *args): Runs a callback every interval seconds.
+    - cancel(handle): Cancels a timer.
+    - advance(): Moves the wheel forward by one tick and returns the expired timers.
+    - run(): Advances the wheel on time and runs the expired callbacks.
+    """
+    def __init__(self, tick=0.1, slots=64, levels=4):
+        """
+        Initializes an empty wheel.
+
+        Parameters:
+        - tick (float): The duration of a tick in seconds, the precision of the timers.
+        - slots (int): The number of slots of each level.
+        - levels (int): The number of levels. Timers can be scheduled up to
+          tick * slots ** levels seconds ahead.
+        """
+        self.tick = tick
+        self.slots = slots
+        self.levels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.current_tick = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        """
+        Starts the thread of the wheel.
+        """
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops the thread of the wheel and waits for the callback it is running, if any.
+        The timers left in the wheel do not run.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            # A callback stopping the wheel cannot wait for its own thread
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+            self.thread = None
+
+    def schedule(self, delay, callback, *args):
+        """
+        Runs a callback once after a delay.
+
+        Parameters:
+        - delay (float): Seconds to wait, rounded up to whole ticks.
+        - callback (callable): The function to call.
+        - args: The arguments of the callback.
+
+        Returns:
+        - TimerHandle: The handle to cancel the timer with.
+
+        Exceptions:
+        - ValueError: If the delay is longer than the wheel can hold.
+        """
+        return self.add(delay, callback, args)
+
+    def schedule_periodic(self, interval, callback, *args):
+        """
+        Runs a callback every interval seconds until the timer is cancelled.
+
+        Parameters:
+        - interval (float): Seconds between two runs.
+        - callback (callable): The function to call.
+        - args: The arguments of the callback.
+
+        Returns:
+        - TimerHandle: The handle to cancel the timer with.
+        """
+        return self.add(interval, callback, args, interval)
+
+    def add(self, delay, callback, args, interval=None):
+        """
+        Creates a timer and puts it in the wheel.
+
+        Parameters:
+        - delay (float): Seconds to wait, rounded up to whole ticks.
+        - callback (callable): The function to call.
+        - args (tuple): The arguments of the callback.
+        - interval (float): The seconds between two runs of a periodic callback, or None.
+
+        Returns:
+        - TimerHandle: The created timer.
+        """
+        ticks = max(1, math.ceil(delay / self.tick))
+        if ticks >= self.slots ** len(self.levels):
+            raise ValueError(f"Delay too long for the timing wheel: {delay} seconds")
+        with self.lock:
+            handle = TimerHandle(self.current_tick + ticks, callback, args, interval)
+            self.insert(handle)
+        return handle
+
+    def insert(self, handle):
+        """
+        Puts a timer in the slot of the lowest level that reaches its deadline. Must be
+        called with the lock held.
+
+        Parameters:
+        - handle (TimerHandle): The timer.
+        """
+        remaining = handle.deadline - self.current_tick
+        level = 0
+        span = 1
+        while remaining >= span * self.slots and level < len(self.levels) - 1:
+            level += 1
+            span *= self.slots
+        handle.slot = self.levels[level][(handle.deadline // span) % self.slots]
+        handle.slot.add(handle)
+
+    def cancel(self, handle):
+        """
+        Cancels a timer. Cancelling a timer that already ran has no effect.
+
+        Parameters:
+        - handle (TimerHandle): The timer.
+        """
+        with self.lock:
+            handle.cancelled = True
+            if handle.slot is not None:
+                handle.slot.discard(handle)
+                handle.slot = None
+
+    def advance(self):
+        """
+        Moves the wheel forward by one tick and returns the expired timers.
+
+        The slots of the upper levels starting at this tick are emptied first, moving
+        their timers down to the levels that now reach them.
+
+        Returns:
+        - list of TimerHandle: The timers whose deadline is the new tick.
+        """
+        with self.lock:
+            self.current_tick += 1
+            span = self.slots
+            for level in range(1, len(self.levels)):
+                if self.current_tick % span:
+                    break
+                slot = self.levels[level][(self.current_tick // span) % self.slots]
+                timers = list(slot)
+                slot.clear()
+                for handle in timers:
+                    self.insert(handle)
+                span *= self.slots
+            slot = self.levels[0][self.current_tick % self.slots]
+            expired = list(slot)
+            slot.clear()
+            for handle in expired:
+                handle.slot = None
+                if handle.interval is not None:
+                    # Periodic timers are put back before running, so cancelling them
+                    # from their own callback works
+                    handle.deadline = self.current_tick + max(1, math.ceil(handle.interval / self.tick))
+                    self.insert(handle)
+        return expired
+
+    def run(self):
+        """
+        Advances the wheel on time and runs the expired callbacks, until stop() is called.
+
+        Ticks missed while callbacks ran are caught up right away.
+        """
+        started = time.monotonic() - self.current_tick * self.tick
+        while not self.stopped.is_set():
+            delay = started + (self.current_tick + 1) * self.tick - time.monotonic()
+            if delay > 0 and self.stopped.wait(delay):
+                break
+            for handle in self.advance():
+                if handle.cancelled or self.stopped.is_set():
+                    continue
+                try:
+                    handle.callback(*handle.args)
+                except Exception as e:
+                    print(f"Error in timer callback: {e}")